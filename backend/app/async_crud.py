@@ -0,0 +1,56 @@
+# app/async_crud.py
+"""
+Async versions of the crud helpers, for the async routers (DB_ASYNC=true).
+Each one runs the sync helper from crud.py through AsyncSession.run_sync, so the SQL is the
+same and the DB I/O goes through the async driver without tying up a threadpool slot.
+Like crud.py they only flush; the router awaits session.commit() once per request.
+"""
+from datetime import date, datetime
+from sqlmodel.ext.asyncio.session import AsyncSession
+from . import crud
+
+async def get_user_by_phone(session: AsyncSession, phone: str):
+    return await session.run_sync(crud.get_user_by_phone, phone)
+
+async def get_user(session: AsyncSession, user_id: int):
+    return await session.run_sync(crud.get_user, user_id)
+
+async def get_or_create_user(session: AsyncSession, phone: str, name: str = None):
+    return await session.run_sync(crud.get_or_create_user, phone, name)
+
+async def get_or_create_users(session: AsyncSession, phones):
+    return await session.run_sync(crud.get_or_create_users, phones)
+
+async def create_transaction(session: AsyncSession, user_id: int, amount: float, currency: str = "KES", tx_type: str = None, source: str = None, raw_sms: str = None, **details):
+    return await session.run_sync(crud.create_transaction, user_id, amount, currency, tx_type, source, raw_sms, **details)
+
+async def create_sms_records_bulk(session: AsyncSession, rows):
+    return await session.run_sync(crud.create_sms_records_bulk, rows)
+
+async def get_transactions_page(session: AsyncSession, phone: str, limit: int = 50, cursor: str = None,
+                                start: datetime = None, end: datetime = None, tx_type: str = None):
+    return await session.run_sync(crud.get_transactions_page, phone, limit, cursor, start, end, tx_type)
+
+async def get_daily_summary(session: AsyncSession, phone: str, start: date, end: date):
+    return await session.run_sync(crud.get_daily_summary, phone, start, end)
+
+async def create_receipt(session: AsyncSession, transaction_id: int):
+    return await session.run_sync(crud.create_receipt, transaction_id)
+
+async def get_receipt_details(session: AsyncSession, receipt_id: int):
+    return await session.run_sync(crud.get_receipt_details, receipt_id)
+
+async def create_or_get_savings_goal(session: AsyncSession, user_id: int):
+    return await session.run_sync(crud.create_or_get_savings_goal, user_id)
+
+async def resolve_savings_goal(session: AsyncSession, user_id: int, goal_id: int = None):
+    return await session.run_sync(crud.resolve_savings_goal, user_id, goal_id)
+
+async def contribute_savings(session: AsyncSession, user_id: int, amount: float, goal_id: int = None):
+    return await session.run_sync(crud.contribute_savings, user_id, amount, goal_id)
+
+async def create_fraud_alert(session: AsyncSession, user_id: int, sms_text: str, score: float, flagged: bool):
+    return await session.run_sync(crud.create_fraud_alert, user_id, sms_text, score, flagged)
+
+async def get_post_ingest_status(session: AsyncSession, transaction_id: int):
+    return await session.run_sync(crud.get_post_ingest_status, transaction_id)
@@ -1,33 +1,258 @@
 # app/crud.py
+"""
+CRUD helpers work as a unit of work: they add + flush (so ids come back via INSERT ... RETURNING)
+but never commit. The router commits once per request, so a failure half way leaves nothing behind.
+"""
 from sqlmodel import Session, select
+from sqlalchemy import tuple_, update
+from sqlalchemy.exc import IntegrityError
 from . import models
-from datetime import datetime
+from .schemas import TransactionOut
+from .utils.pagination import decode_cursor, encode_cursor
+from .utils.behavior import behavior_profiles
+from .utils.user_cache import user_cache
+from .utils.fraud_detector import is_flagged
+from datetime import date, datetime
+
+DETAIL_FIELDS = ("mpesa_code", "counterparty_name", "counterparty_phone", "balance", "event_time")
+
+class DuplicateTransactionError(Exception):
+    """
+    An M-Pesa transaction code that is already stored (the same SMS forwarded twice).
+    """
+    def __init__(self, mpesa_code: str = None):
+        super().__init__(f"Duplicate M-Pesa transaction {mpesa_code or ''}".strip())
+        self.mpesa_code = mpesa_code
+
+class DuplicateIngestKeyError(Exception):
+    """
+    The idempotency key was claimed by a concurrent request that committed first.
+    """
+
+def claim_ingest_key(session: Session, key: str, request_hash: str):
+    """
+    Inserts the IngestKey row before any other write of the request, so a concurrent retry
+    blocks on the primary key and then fails here. Set .response before commit.
+    Raises DuplicateIngestKeyError; the session is rolled back.
+    """
+    claim = models.IngestKey(key=key, request_hash=request_hash)
+    session.add(claim)
+    try:
+        session.flush()
+    except IntegrityError:
+        session.rollback()
+        raise DuplicateIngestKeyError(key)
+    return claim
+
+def add_ingest_keys(session: Session, responses):
+    """
+    responses: dict key -> JSON response. Bulk version of claim_ingest_key for the batch endpoint,
+    whose keys are request hashes.
+    """
+    session.add_all([models.IngestKey(key=k, request_hash=k, response=v) for k, v in responses.items()])
+    try:
+        session.flush()
+    except IntegrityError:
+        session.rollback()
+        raise DuplicateIngestKeyError()
+
+def get_user_by_phone(session: Session, phone: str):
+    """
+    CachedUser (id, phone, name) with this phone, or None. Reads through user_cache: a hit costs no query.
+    """
+    user = user_cache.by_phone(phone)
+    if user is None:
+        User = models.User
+        row = session.exec(select(User.id, User.phone, User.name).where(User.phone == phone)).first()
+        if row is not None:
+            user = user_cache.put(session, row)
+    return user
+
+def get_user(session: Session, user_id: int):
+    """
+    CachedUser by id, or None. Reads through user_cache.
+    """
+    user = user_cache.by_id(user_id)
+    if user is None:
+        row = session.get(models.User, user_id)
+        if row is not None:
+            user = user_cache.put(session, row)
+    return user
 
 def get_or_create_user(session: Session, phone: str, name: str = None):
-    stmt = select(models.User).where(models.User.phone == phone)
-    user = session.exec(stmt).first()
-    if user:
+    """
+    CachedUser for phone, created if missing. Two requests racing to create the same phone both
+    run INSERT ... ON CONFLICT (phone) DO NOTHING: the loser gets no row back and reads the
+    winner's instead of failing on the unique index.
+    """
+    user = get_user_by_phone(session, phone)
+    if user is not None:
         return user
-    user = models.User(phone=phone, name=name)
-    session.add(user)
-    session.commit()
-    session.refresh(user)
-    return user
+    users = _insert_users(session, {phone: name})
+    return users.get(phone) or get_user_by_phone(session, phone)
+
+def _insert_users(session: Session, names):
+    """
+    names: dict phone -> name. Inserts the users whose phone is not taken yet and returns
+    dict phone -> CachedUser for the ones this call inserted (cached when the transaction commits).
+    """
+    User = models.User
+    now = datetime.utcnow()
+    values = [{"phone": p, "name": n, "created_at": now} for p, n in names.items()]
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        # no portable upsert: plain INSERT (a concurrent insert of the same phone fails on the unique index)
+        rows = [User(**v) for v in values]
+        session.add_all(rows)
+        session.flush()
+        return {row.phone: user_cache.put_on_commit(session, row) for row in rows}
+    stmt = (insert(User).values(values)
+            .on_conflict_do_nothing(index_elements=[User.phone])
+            .returning(User.id, User.phone, User.name))
+    rows = session.execute(stmt).all()
+    return {row.phone: user_cache.put_on_commit(session, row) for row in rows}
 
-def create_transaction(session: Session, user_id: int, amount: float, currency: str = "KES", tx_type: str = None, source: str = None, raw_sms: str = None):
-    tx = models.Transaction(user_id=user_id, amount=amount, currency=currency, tx_type=tx_type, source=source, raw_sms=raw_sms, timestamp=datetime.utcnow())
+def create_transaction(session: Session, user_id: int, amount: float, currency: str = "KES", tx_type: str = None, source: str = None, raw_sms: str = None, **details):
+    """
+    details: the optional parse_details fields (mpesa_code, counterparty_name, counterparty_phone, balance, event_time).
+    Raises DuplicateTransactionError if the user already has this mpesa_code; the session is rolled back.
+    """
+    tx = models.Transaction(user_id=user_id, amount=amount, currency=currency, tx_type=tx_type, source=source, raw_sms=raw_sms, timestamp=datetime.utcnow(), **details)
     session.add(tx)
-    session.commit()
-    session.refresh(tx)
+    _flush_transactions(session, [tx])
+    add_to_daily_aggregates(session, [tx])
+    behavior_profiles.observe(session, [tx])
     return tx
 
+def _flush_transactions(session: Session, txs):
+    # the unique index on (user_id, mpesa_code) rejects duplicates without a lookup first
+    try:
+        session.flush()
+    except IntegrityError:
+        session.rollback()
+        codes = [tx.mpesa_code for tx in txs if tx.mpesa_code]
+        if not codes:
+            raise
+        raise DuplicateTransactionError(codes[0] if len(codes) == 1 else None)
+
+def add_to_daily_aggregates(session: Session, txs):
+    """
+    Adds transactions to DailyAggregate in the caller's DB transaction, with one
+    INSERT ... ON CONFLICT DO UPDATE SET total = total + excluded.total (executemany) per call.
+    txs: objects with user_id, timestamp, tx_type, amount.
+    """
+    deltas = {}
+    for tx in txs:
+        key = (tx.user_id, tx.timestamp.date(), tx.tx_type or "UNKNOWN")
+        amount, count = deltas.get(key, (0.0, 0))
+        deltas[key] = (amount + tx.amount, count + 1)
+    if not deltas:
+        return
+    rows = [{"user_id": u, "day": d, "tx_type": t, "total_amount": a, "tx_count": c}
+            for (u, d, t), (a, c) in deltas.items()]
+
+    agg = models.DailyAggregate
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        # no portable upsert: read-modify-write (not safe under concurrent writers)
+        for r in rows:
+            row = session.get(agg, (r["user_id"], r["day"], r["tx_type"]))
+            if row is None:
+                session.add(agg(**r))
+            else:
+                row.total_amount += r["total_amount"]
+                row.tx_count += r["tx_count"]
+        session.flush()
+        return
+    stmt = insert(agg)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[agg.user_id, agg.day, agg.tx_type],
+        set_={"total_amount": agg.total_amount + stmt.excluded.total_amount,
+              "tx_count": agg.tx_count + stmt.excluded.tx_count},
+    )
+    session.execute(stmt, rows)
+
+def get_daily_summary(session: Session, phone: str, start: date, end: date):
+    """
+    DailyAggregate rows of a user for days in [start, end], plus the user's savings goals.
+    Reads O(days) pre-summed rows instead of the user's transactions. Returns None if the user doesn't exist.
+    """
+    user = get_user_by_phone(session, phone)
+    if user is None:
+        return None
+    user_id = user.id
+    agg = models.DailyAggregate
+    stmt = (select(agg.day, agg.tx_type, agg.total_amount, agg.tx_count)
+            .where(agg.user_id == user_id, agg.day >= start, agg.day <= end)
+            .order_by(agg.day))
+    days = session.exec(stmt).all()
+    goals_stmt = select(models.SavingsGoal).where(models.SavingsGoal.user_id == user_id)
+    goals = session.exec(goals_stmt).all()
+    return days, goals
+
+# only the columns TransactionOut needs (not raw_sms)
+TRANSACTION_OUT_COLUMNS = [getattr(models.Transaction, name) for name in TransactionOut.model_fields]
+
+def get_transactions_page(session: Session, phone: str, limit: int = 50, cursor: str = None,
+                          start: datetime = None, end: datetime = None, tx_type: str = None):
+    """
+    One page of a user's history, newest first, as rows of TRANSACTION_OUT_COLUMNS.
+    Keyset pagination on (timestamp, id) served by ix_transaction_user_id_timestamp_id, so deep
+    pages cost the same as the first. Returns (rows, next_cursor); next_cursor is None on the last page.
+    Raises ValueError for a malformed cursor. An unknown phone has no rows.
+    """
+    Transaction = models.Transaction
+    if cursor:
+        ts, tx_id = decode_cursor(cursor)
+    user = get_user_by_phone(session, phone)
+    if user is None:
+        return [], None
+    stmt = select(*TRANSACTION_OUT_COLUMNS).where(Transaction.user_id == user.id)
+    if start is not None:
+        stmt = stmt.where(Transaction.timestamp >= start)
+    if end is not None:
+        stmt = stmt.where(Transaction.timestamp < end)
+    if tx_type:
+        stmt = stmt.where(Transaction.tx_type == tx_type)
+    if cursor:
+        stmt = stmt.where(tuple_(Transaction.timestamp, Transaction.id) < tuple_(ts, tx_id))
+    stmt = stmt.order_by(Transaction.timestamp.desc(), Transaction.id.desc()).limit(limit + 1)
+
+    rows = session.exec(stmt).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].timestamp, rows[-1].id)
+    return rows, next_cursor
+
 def create_receipt(session: Session, transaction_id: int):
     r = models.Receipt(transaction_id=transaction_id)
     session.add(r)
-    session.commit()
-    session.refresh(r)
+    session.flush()
     return r
 
+def get_receipt_details(session: Session, receipt_id: int):
+    """
+    Receipt and its transaction in one joined query, the user from user_cache.
+    Returns (receipt, transaction, CachedUser) or None.
+    """
+    stmt = (select(models.Receipt, models.Transaction)
+            .join(models.Transaction, models.Transaction.id == models.Receipt.transaction_id)
+            .where(models.Receipt.id == receipt_id))
+    row = session.exec(stmt).first()
+    if row is None:
+        return None
+    receipt, tx = row
+    return receipt, tx, get_user(session, tx.user_id)
+
 def create_or_get_savings_goal(session: Session, user_id: int):
     stmt = select(models.SavingsGoal).where(models.SavingsGoal.user_id == user_id)
     g = session.exec(stmt).first()
@@ -35,24 +260,141 @@ def create_or_get_savings_goal(session: Session, user_id: int):
         return g
     g = models.SavingsGoal(user_id=user_id, target_amount=5000.0, current_amount=0.0, name="Default Goal")
     session.add(g)
-    session.commit()
-    session.refresh(g)
+    session.flush()
     return g
 
-def contribute_savings(session: Session, user_id: int, amount: float, goal_id: int = None):
+def resolve_savings_goal(session: Session, user_id: int, goal_id: int = None):
+    """
+    Id of the goal a contribution goes to: goal_id if that goal exists, else the user's default
+    goal (created if missing). Returns None for an unknown goal_id.
+    """
     if goal_id:
-        goal = session.get(models.SavingsGoal, goal_id)
-    else:
-        goal = create_or_get_savings_goal(session, user_id)
-    goal.current_amount = (goal.current_amount or 0) + amount
-    session.add(goal)
-    session.commit()
-    session.refresh(goal)
-    return goal
+        return session.exec(select(models.SavingsGoal.id).where(models.SavingsGoal.id == goal_id)).first()
+    return create_or_get_savings_goal(session, user_id).id
+
+def add_savings_contributions(session: Session, goal_id: int, contributions):
+    """
+    Applies (user_id, amount) contributions to one goal: one atomic
+    UPDATE ... SET current_amount = current_amount + :total RETURNING, plus one ledger row each.
+    The increment is computed by the database, so concurrent contributions never overwrite each
+    other and no row lock is held across a read. Returns (id, current_amount, target_amount)
+    after the update, or None if the goal doesn't exist. Does not commit.
+    """
+    goal = models.SavingsGoal
+    total = sum(amount for _, amount in contributions)
+    stmt = (update(goal).where(goal.id == goal_id)
+            .values(current_amount=goal.current_amount + total)
+            .returning(goal.id, goal.current_amount, goal.target_amount)
+            .execution_options(synchronize_session=False))
+    row = session.execute(stmt).first()
+    if row is None:
+        return None
+    session.add_all([models.SavingsContribution(goal_id=goal_id, user_id=user_id, amount=amount)
+                     for user_id, amount in contributions])
+    session.flush()
+    # float(): SQLite's RETURNING hands back integral REALs as ints
+    return row.id, float(row.current_amount), float(row.target_amount)
+
+def contribute_savings(session: Session, user_id: int, amount: float, goal_id: int = None):
+    goal_id = resolve_savings_goal(session, user_id, goal_id)
+    if goal_id is None:
+        return None
+    return add_savings_contributions(session, goal_id, [(user_id, amount)])
 
 def create_fraud_alert(session: Session, user_id: int, sms_text: str, score: float, flagged: bool):
     fa = models.FraudAlert(user_id=user_id, sms_text=sms_text, score=score, flagged=flagged)
     session.add(fa)
-    session.commit()
-    session.refresh(fa)
+    session.flush()
     return fa
+
+def create_post_ingest_job(session: Session, transaction_id: int):
+    job = models.PostIngestJob(transaction_id=transaction_id)
+    session.add(job)
+    session.flush()
+    return job
+
+def get_post_ingest_status(session: Session, transaction_id: int):
+    """
+    (PostIngestJob, FraudAlert or None) for a transaction, or None if it has no job.
+    """
+    job = models.PostIngestJob
+    stmt = (select(job, models.FraudAlert)
+            .outerjoin(models.FraudAlert, models.FraudAlert.id == job.alert_id)
+            .where(job.transaction_id == transaction_id))
+    return session.exec(stmt).first()
+
+def get_or_create_users(session: Session, phones):
+    """
+    Resolves many phones at once: cached ones cost nothing, then one SELECT for the other existing
+    users and one INSERT ... ON CONFLICT DO NOTHING for the rest.
+    Returns dict phone -> CachedUser. Does not commit.
+    """
+    users = {}
+    missing = set()
+    for phone in set(phones):
+        user = user_cache.by_phone(phone)
+        if user is not None:
+            users[phone] = user
+        else:
+            missing.add(phone)
+    if missing:
+        User = models.User
+        stmt = select(User.id, User.phone, User.name).where(User.phone.in_(missing))
+        users.update({row.phone: user_cache.put(session, row) for row in session.exec(stmt).all()})
+        new = [p for p in missing if p not in users]
+        if new:
+            users.update(_insert_users(session, dict.fromkeys(new)))
+            # created concurrently since the SELECT
+            for phone in new:
+                if phone not in users:
+                    users[phone] = get_user_by_phone(session, phone)
+    return users
+
+def create_sms_records_bulk(session: Session, rows):
+    """
+    rows: list of dicts with phone, amount, tx_type, source, raw_sms, score (keyword score) + optional parse_details fields.
+    Inserts users, transactions, receipts and fraud alerts for all rows with bulk flushes.
+    Returns list of (transaction, receipt, fraud_alert) in the same order as rows, or None for a row
+    whose mpesa_code is already stored for its phone or repeated for it earlier in the batch.
+    Does not commit: the caller commits once, so the whole batch is one DB transaction.
+    """
+    # one indexed IN lookup for the whole batch instead of failing on the first duplicate
+    codes = {r["mpesa_code"] for r in rows if r.get("mpesa_code")}
+    seen = set()  # (phone, mpesa_code)
+    if codes:
+        stmt = (select(models.User.phone, models.Transaction.mpesa_code)
+                .join(models.User, models.User.id == models.Transaction.user_id)
+                .where(models.Transaction.mpesa_code.in_(codes)))
+        seen.update(tuple(row) for row in session.exec(stmt).all())
+    keep = []
+    for r in rows:
+        key = (r["phone"], r.get("mpesa_code"))
+        keep.append(not key[1] or key not in seen)
+        if key[1]:
+            seen.add(key)
+    new_rows = [r for r, k in zip(rows, keep) if k]
+    if not new_rows:
+        return [None] * len(rows)
+
+    users = get_or_create_users(session, (r["phone"] for r in new_rows))
+    now = datetime.utcnow()
+    txs = [models.Transaction(user_id=users[r["phone"]].id, amount=r["amount"], currency="KES",
+                              tx_type=r.get("tx_type"), source=r.get("source"), raw_sms=r["raw_sms"], timestamp=now,
+                              **{k: r.get(k) for k in DETAIL_FIELDS})
+           for r in new_rows]
+    session.add_all(txs)
+    _flush_transactions(session, txs)
+    add_to_daily_aggregates(session, txs)
+    behavior_profiles.observe(session, txs)
+
+    receipts = [models.Receipt(transaction_id=tx.id) for tx in txs]
+    alerts = []
+    for tx, r in zip(txs, new_rows):
+        # keyword score + the user's behaviour (earlier rows of this batch included)
+        score = min(r["score"] + behavior_profiles.score(session, tx), 1.0)
+        alerts.append(models.FraudAlert(user_id=tx.user_id, sms_text=r["raw_sms"], score=score, flagged=is_flagged(score)))
+    session.add_all(receipts)
+    session.add_all(alerts)
+    session.flush()
+    records = iter(zip(txs, receipts, alerts))
+    return [next(records) if k else None for k in keep]
@@ -1,11 +1,13 @@
 """
 Create engine connects to Postgress
 get_session used to get DB sessions by FastAPI"
+get_async_session is the same for async routers (DB_ASYNC=true, uses asyncpg)
 """
 # app/database.py
 from sqlmodel import create_engine, Session
 import os
 from dotenv import load_dotenv
+from .utils.metrics import TimedAsyncAdaptedQueuePool, TimedQueuePool
 
 load_dotenv()
 
@@ -13,8 +15,66 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise RuntimeError("DATABASE_URL not set in .env")
 
-engine = create_engine(DATABASE_URL, echo=False)
+
+def _env_bool(name: str, default: str) -> bool:
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+DB_ASYNC = _env_bool("DB_ASYNC", "false")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", "true")
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+
+def _engine_kwargs(url: str, is_async: bool = False) -> dict:
+    # same pool classes as the defaults, plus checkout wait time in /metrics
+    poolclass = TimedAsyncAdaptedQueuePool if is_async else TimedQueuePool
+    if url.startswith("sqlite"):
+        # local stand-in: no server-side pool to tune, but allow use from the threadpool
+        kwargs = {"connect_args": {"check_same_thread": False}}
+        if ":memory:" not in url:
+            kwargs["poolclass"] = poolclass
+        return kwargs
+    return {
+        "poolclass": poolclass,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+
+
+def _async_url(url: str) -> str:
+    # postgresql://, postgres:// and postgresql+psycopg2:// all map to asyncpg
+    scheme, rest = url.split("://", 1)
+    if scheme.startswith("postgres"):
+        return "postgresql+asyncpg://" + rest
+    if scheme.startswith("sqlite"):
+        return "sqlite+aiosqlite://" + rest
+    return url
+
+
+engine = create_engine(DATABASE_URL, echo=False, **_engine_kwargs(DATABASE_URL))
 
 def get_session():
-    with Session(engine) as session:
+    # expire_on_commit=False: routers commit once and then read the flushed rows
+    # for the response, without a refresh SELECT per object
+    with Session(engine, expire_on_commit=False) as session:
+        yield session
+
+
+async_engine = None
+if DB_ASYNC:
+    # optional dependency: only needed when the async routers are enabled
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlmodel.ext.asyncio.session import AsyncSession
+
+    ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _async_url(DATABASE_URL)
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, echo=False, **_engine_kwargs(ASYNC_DATABASE_URL, is_async=True))
+
+async def get_async_session():
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
         yield session
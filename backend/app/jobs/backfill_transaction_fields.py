@@ -0,0 +1,90 @@
+# app/jobs/backfill_transaction_fields.py
+"""
+Re-parses Transaction.raw_sms for existing rows and fills the parsed columns
+(mpesa_code, counterparty_name, counterparty_phone, balance, event_time).
+
+Streams the table in primary-key order, CHUNK_SIZE rows at a time (keyset on id, so every
+chunk is an index range scan), and writes each chunk with one bulk UPDATE + commit.
+If the same M-Pesa code appears on several rows of one user, the oldest row keeps it (the
+sender and the receiver of a transfer each keep theirs).
+
+Run from backend/:
+    python -m app.jobs.backfill_transaction_fields [--chunk-size 1000]
+"""
+import argparse
+
+from sqlalchemy import inspect, text, update
+from sqlmodel import Session, select
+
+from ..database import engine
+from ..models import Transaction
+from ..utils.sms_parser import parse_details
+
+
+def ensure_columns(engine):
+    """
+    create_all() doesn't alter existing tables: add the parsed columns + their indexes if missing,
+    and drop the old unique index on mpesa_code alone (codes are unique per user).
+    """
+    table = Transaction.__table__
+    have = {c["name"] for c in inspect(engine).get_columns(table.name)}
+    quote = engine.dialect.identifier_preparer.quote
+    with engine.begin() as conn:
+        for col in table.columns:
+            if col.name not in have:
+                conn.execute(text(f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(col.name)} {col.type.compile(engine.dialect)}"))
+        if any(i["name"] == "ix_transaction_mpesa_code" and i["unique"] for i in inspect(conn).get_indexes(table.name)):
+            conn.execute(text(f"DROP INDEX {quote('ix_transaction_mpesa_code')}"))
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+def backfill(chunk_size: int = 1000) -> int:
+    last_id = 0
+    updated = 0
+    while True:
+        with Session(engine) as session:
+            stmt = (select(Transaction.id, Transaction.user_id, Transaction.raw_sms)
+                    .where(Transaction.id > last_id, Transaction.raw_sms.is_not(None))
+                    .order_by(Transaction.id)
+                    .limit(chunk_size))
+            rows = session.exec(stmt).all()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            params = [{"id": tx_id, **parse_details(raw_sms)} for tx_id, _, raw_sms in rows]
+            user_ids = {tx_id: user_id for tx_id, user_id, _ in rows}
+
+            # a user's codes already owned by another (older or already backfilled) row stay there
+            codes = {p["mpesa_code"] for p in params if p["mpesa_code"]}
+            owners = {}
+            if codes:
+                owner_stmt = (select(Transaction.user_id, Transaction.mpesa_code, Transaction.id)
+                              .where(Transaction.mpesa_code.in_(codes)))
+                owners = {(user_id, code): tx_id for user_id, code, tx_id in session.exec(owner_stmt).all()}
+            for p in params:
+                code = p["mpesa_code"]
+                if code:
+                    owner = owners.setdefault((user_ids[p["id"]], code), p["id"])
+                    if owner != p["id"]:
+                        p["mpesa_code"] = None
+
+            # bulk UPDATE by primary key (executemany)
+            session.execute(update(Transaction), params)
+            session.commit()
+            updated += len(params)
+            print(f"backfilled {updated} rows (last id {last_id})")
+    return updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+    ensure_columns(engine)
+    backfill(args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
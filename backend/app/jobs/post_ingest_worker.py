@@ -0,0 +1,43 @@
+# app/jobs/post_ingest_worker.py
+"""
+Standalone post-ingest worker: claims jobs from the PostIngestJob table (the durable queue of
+POST_INGEST_MODE=db) and makes their receipts and fraud alerts, until interrupted.
+Run as many as needed next to API processes started with POST_INGEST_MODE=db (their own
+workers can be turned off with POST_INGEST_WORKERS=0).
+
+Run from backend/:
+    python -m app.jobs.post_ingest_worker [--workers 8]
+"""
+import argparse
+import asyncio
+
+from sqlmodel import SQLModel
+
+from ..database import engine
+from ..utils.post_ingest import WORKERS, PostIngestPipeline
+
+
+async def run(workers: int):
+    pipeline = PostIngestPipeline(mode="db", workers=workers)
+    await pipeline.start()
+    try:
+        while True:
+            await asyncio.sleep(60)
+            print(pipeline.stats())
+    finally:
+        await pipeline.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=WORKERS or 4)
+    args = parser.parse_args()
+    SQLModel.metadata.create_all(engine)
+    try:
+        asyncio.run(run(args.workers))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# app/jobs/purge_ingest_keys.py
+"""
+Deletes IngestKey rows older than the retention window (IDEMPOTENCY_RETENTION_DAYS, default 7).
+
+Walks the created_at index oldest first and deletes CHUNK_SIZE keys per transaction, so a large
+backlog never holds long locks. A request retried after its key was purged is treated as new;
+a repeated M-Pesa code is still rejected by the transaction's unique index. Schedule it daily.
+
+Run from backend/:
+    python -m app.jobs.purge_ingest_keys [--days 7] [--chunk-size 5000]
+"""
+import argparse
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, inspect, text
+from sqlmodel import Session, select
+
+from ..database import engine
+from ..models import IngestKey
+
+
+def ensure_columns(engine):
+    """
+    create_all() doesn't alter existing tables: add request_hash and the created_at index if missing.
+    """
+    table = IngestKey.__table__
+    have = {c["name"] for c in inspect(engine).get_columns(table.name)}
+    quote = engine.dialect.identifier_preparer.quote
+    with engine.begin() as conn:
+        for col in table.columns:
+            if col.name not in have:
+                conn.execute(text(f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(col.name)} "
+                                  f"{col.type.compile(engine.dialect)} NOT NULL DEFAULT ''"))
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+def purge(days: int, chunk_size: int = 5000) -> int:
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    deleted = 0
+    while True:
+        with Session(engine) as session:
+            stmt = (select(IngestKey.key)
+                    .where(IngestKey.created_at < cutoff)
+                    .order_by(IngestKey.created_at)
+                    .limit(chunk_size))
+            keys = session.exec(stmt).all()
+            if not keys:
+                break
+            session.execute(delete(IngestKey).where(IngestKey.key.in_(keys)))
+            session.commit()
+            deleted += len(keys)
+            print(f"deleted {deleted} keys")
+    return deleted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=int(os.getenv("IDEMPOTENCY_RETENTION_DAYS", "7")))
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    args = parser.parse_args()
+    ensure_columns(engine)
+    purge(args.days, args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
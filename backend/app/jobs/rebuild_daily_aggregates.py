@@ -0,0 +1,63 @@
+# app/jobs/rebuild_daily_aggregates.py
+"""
+Recomputes DailyAggregate from the Transaction history.
+
+Works through users in id ranges of about CHUNK_SIZE transactions. For each range, one DB
+transaction deletes the range's DailyAggregate rows and adds its transactions back with
+crud.add_to_daily_aggregates (one upsert executemany), so the summary endpoint sees each user's
+old totals or the rebuilt ones, never an empty or partial table, and a crash leaves every range
+either rebuilt or untouched. Run it while ingestion is paused: transactions written during the
+rebuild could be counted twice.
+
+Run from backend/:
+    python -m app.jobs.rebuild_daily_aggregates [--chunk-size 5000]
+"""
+import argparse
+
+from sqlalchemy import delete
+from sqlmodel import Session, select
+
+from .. import crud
+from ..database import engine
+from ..models import DailyAggregate, Transaction
+
+
+def rebuild(chunk_size: int = 5000) -> int:
+    last_user = 0
+    done = 0
+    while True:
+        with Session(engine) as session:
+            # the range ends with the user of the chunk_size-th transaction, so no user is split;
+            # the last range (hi is None) also clears aggregates of users past the last transaction
+            hi = session.exec(select(Transaction.user_id)
+                              .where(Transaction.user_id > last_user)
+                              .order_by(Transaction.user_id)
+                              .offset(chunk_size - 1)
+                              .limit(1)).first()
+            in_range = [DailyAggregate.user_id > last_user]
+            tx_in_range = [Transaction.user_id > last_user]
+            if hi is not None:
+                in_range.append(DailyAggregate.user_id <= hi)
+                tx_in_range.append(Transaction.user_id <= hi)
+            session.execute(delete(DailyAggregate).where(*in_range))
+            rows = session.exec(select(Transaction.user_id, Transaction.timestamp, Transaction.tx_type, Transaction.amount)
+                                .where(*tx_in_range)).all()
+            crud.add_to_daily_aggregates(session, rows)
+            session.commit()
+        done += len(rows)
+        print(f"aggregated {done} transactions" + (f" (users up to id {hi})" if hi is not None else ""))
+        if hi is None:
+            break
+        last_user = hi
+    return done
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    args = parser.parse_args()
+    rebuild(args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
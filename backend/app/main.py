@@ -1,9 +1,10 @@
 # app/main.py
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .database import engine
+from fastapi.responses import PlainTextResponse
+from .database import engine, async_engine, DB_ASYNC
+from .utils import metrics
 from .models import *
-from .routers import sms_router, transactions_router, savings_router
 import os
 from dotenv import load_dotenv
 
@@ -19,14 +20,64 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
+# outermost, so latency includes CORS and the whole response body
+app.add_middleware(metrics.MetricsMiddleware)
+
+# DB_ASYNC=true swaps in the async routers (same paths, async engine + asyncpg)
+if DB_ASYNC:
+    from .routers import async_sms_router as sms_router
+    from .routers import async_transactions_router as transactions_router
+    from .routers import async_savings_router as savings_router
+else:
+    from .routers import sms_router, transactions_router, savings_router
 
 app.include_router(sms_router.router)
 app.include_router(transactions_router.router)
 app.include_router(savings_router.router)
 
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    # Prometheus text format
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+def _pool_stats():
+    pool = (async_engine.sync_engine if async_engine is not None else engine).pool
+    if not hasattr(pool, "checkedout"):
+        return {}
+    return {("checked_out",): pool.checkedout(), ("idle",): pool.checkedin(), ("overflow",): max(pool.overflow(), 0)}
+
+def _cache_stats():
+    from .utils.behavior import behavior_profiles
+    from .utils.idempotency import idempotency_store
+    from .utils.pdf_cache import receipt_cache
+    from .utils.user_cache import user_cache
+    stats = {}
+    for name, cache in (("receipt_pdf", receipt_cache.memory), ("behavior", behavior_profiles.cache),
+                        ("idempotency", idempotency_store.cache), ("user_by_phone", user_cache.phones),
+                        ("user_by_id", user_cache.ids)):
+        stats[(name, "hits")] = cache.hits
+        stats[(name, "misses")] = cache.misses
+        stats[(name, "size")] = len(cache)
+    return stats
+
+metrics.Gauge("db_pool_connections", "Connections of the DB pool.", _pool_stats, ("state",))
+metrics.Gauge("cache_stats", "In-process caches: hits, misses and entries.", _cache_stats, ("cache", "stat"))
+
 @app.on_event("startup")
 def on_startup():
     # Create DB tables (hackathon style)
     from sqlmodel import SQLModel
     SQLModel.metadata.create_all(bind=engine)
+
+@app.on_event("startup")
+async def start_post_ingest():
+    # background workers for receipts + fraud alerts (see utils/post_ingest.py)
+    from .utils.post_ingest import post_ingest
+    await post_ingest.start()
+
+@app.on_event("shutdown")
+async def stop_post_ingest():
+    from .utils.post_ingest import post_ingest
+    await post_ingest.stop()
@@ -1,7 +1,8 @@
 # app/models.py
 from typing import Optional
-from datetime import datetime
+from datetime import date, datetime
 from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import Index
 
 class User(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -18,6 +19,35 @@ class Transaction(SQLModel, table=True):
     source: Optional[str] = None   # e.g., "M-PESA", "Manual"
     timestamp: datetime = Field(default_factory=datetime.utcnow)
     raw_sms: Optional[str] = None
+    # parsed from raw_sms once at ingest, so later analysis doesn't re-parse text
+    mpesa_code: Optional[str] = Field(default=None, index=True)  # e.g. "QGH7ABC123"
+    counterparty_name: Optional[str] = None
+    counterparty_phone: Optional[str] = None
+    balance: Optional[float] = None
+    event_time: Optional[datetime] = None  # time stated in the SMS
+
+# history pages: WHERE user_id = ? AND (timestamp, id) < (cursor) ORDER BY timestamp DESC, id DESC
+Index("ix_transaction_user_id_timestamp_id", Transaction.user_id, Transaction.timestamp.desc(), Transaction.id.desc())
+# rejects a user forwarding the same SMS twice; the sender and the receiver of one transfer
+# both get an SMS with its code, so the code alone is not unique
+Index("ux_transaction_user_id_mpesa_code", Transaction.user_id, Transaction.mpesa_code, unique=True)
+
+class IngestKey(SQLModel, table=True):
+    # one row per ingested SMS: Idempotency-Key header, or a hash of phone + normalized SMS text
+    # (utils/idempotency.py). The primary key makes a retried request fail to claim it again.
+    key: str = Field(primary_key=True)
+    request_hash: str = ""  # phone + normalized SMS text, to reject a key reused for another SMS
+    response: str = ""  # JSON of the response sent the first time
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)  # purge_ingest_keys
+
+class DailyAggregate(SQLModel, table=True):
+    # per-user, per-day totals by tx_type, kept up to date by crud.create_transaction
+    # (primary key order serves "user X between day A and B" range scans)
+    user_id: int = Field(foreign_key="user.id", primary_key=True)
+    day: date = Field(primary_key=True)
+    tx_type: str = Field(primary_key=True)  # RECEIVE / SEND / UNKNOWN
+    total_amount: float = 0.0
+    tx_count: int = 0
 
 class Receipt(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -32,6 +62,14 @@ class SavingsGoal(SQLModel, table=True):
     current_amount: float = 0.0
     name: Optional[str] = None
 
+class SavingsContribution(SQLModel, table=True):
+    # append-only ledger; SavingsGoal.current_amount is the running sum of these
+    id: Optional[int] = Field(default=None, primary_key=True)
+    goal_id: int = Field(foreign_key="savingsgoal.id", index=True)
+    user_id: int = Field(foreign_key="user.id")
+    amount: float
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
 class FraudAlert(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="user.id")
@@ -39,3 +77,15 @@ class FraudAlert(SQLModel, table=True):
     score: float
     flagged: bool = False
     created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class PostIngestJob(SQLModel, table=True):
+    # receipt + fraud alert for a transaction ingested via /api/sms/parse, made after the response
+    id: Optional[int] = Field(default=None, primary_key=True)
+    transaction_id: int = Field(foreign_key="transaction.id", index=True, unique=True)
+    status: str = Field(default="pending", index=True)  # pending / running / done / failed
+    attempts: int = 0
+    receipt_id: Optional[int] = None
+    alert_id: Optional[int] = None
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -0,0 +1,30 @@
+# app/routers/async_savings_router.py
+# Async twin of savings_router.py, mounted instead of it when DB_ASYNC=true.
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from sqlmodel.ext.asyncio.session import AsyncSession
+from ..database import get_async_session
+from .. import async_crud
+from ..schemas import SavingsContribute
+from ..utils.savings_batcher import savings_batcher
+
+router = APIRouter(prefix="/api/savings", tags=["savings"])
+
+@router.post("/contribute")
+async def contribute(payload: SavingsContribute, session: AsyncSession = Depends(get_async_session)):
+    user = await async_crud.get_user_by_phone(session, payload.user_phone)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found.")
+    if savings_batcher is not None:
+        goal_id = await async_crud.resolve_savings_goal(session, user.id, payload.goal_id)
+        if goal_id is None:
+            raise HTTPException(status_code=404, detail="Savings goal not found.")
+        await session.commit()  # a newly created default goal must be visible to the batch writer
+        goal = await run_in_threadpool(savings_batcher.contribute, goal_id, user.id, payload.amount)
+    else:
+        goal = await async_crud.contribute_savings(session, user_id=user.id, amount=payload.amount, goal_id=payload.goal_id)
+        await session.commit()
+    if goal is None:
+        raise HTTPException(status_code=404, detail="Savings goal not found.")
+    goal_id, current_amount, target = goal
+    return {"goal_id": goal_id, "current_amount": current_amount, "target": target}
@@ -0,0 +1,71 @@
+# app/routers/async_sms_router.py
+"""
+Async twin of sms_router.py, mounted instead of it when DB_ASYNC=true.
+Same paths and responses. DB work goes through async_crud or, for the SMS ingest flows, runs the
+sync router functions via AsyncSession.run_sync; PDF rendering/caching goes through the threadpool.
+"""
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from sqlmodel.ext.asyncio.session import AsyncSession
+from ..database import get_async_session
+from ..schemas import SMSIn, SMSBatchIn
+from .. import async_crud
+from ..utils.idempotency import idempotency_store
+from ..utils.receipt_generator import generate_receipt_pdf, receipt_cache_key
+from ..utils.pdf_cache import receipt_cache, etag_matches
+from ..utils.post_ingest import post_ingest
+from .sms_router import ingest_sms, ingest_batch, build_status, receipt_headers, export_response
+from fastapi.responses import Response
+from typing import Optional
+from datetime import date
+
+router = APIRouter(prefix="/api/sms", tags=["sms"])
+
+@router.post("/parse", response_model=dict)
+async def parse_sms(payload: SMSIn, session: AsyncSession = Depends(get_async_session),
+                    idempotency_key: Optional[str] = Header(None)):
+    # same flow as the sync router; its SQL runs on the async driver inside run_sync
+    return await session.run_sync(ingest_sms, payload.phone, payload.text, idempotency_key)
+
+@router.post("/parse/batch", response_model=dict)
+async def parse_sms_batch(payload: SMSBatchIn, session: AsyncSession = Depends(get_async_session)):
+    return await session.run_sync(ingest_batch, payload.items)
+
+@router.get("/dedup/stats", response_model=dict)
+async def dedup_stats():
+    return idempotency_store.stats()
+
+@router.get("/status/{transaction_id}", response_model=dict)
+async def post_ingest_status(transaction_id: int, session: AsyncSession = Depends(get_async_session)):
+    return build_status(transaction_id, await async_crud.get_post_ingest_status(session, transaction_id))
+
+@router.get("/pipeline/stats", response_model=dict)
+async def pipeline_stats():
+    return post_ingest.stats()
+
+@router.get("/receipt/{receipt_id}/pdf")
+async def get_receipt_pdf(receipt_id: int, session: AsyncSession = Depends(get_async_session),
+                          if_none_match: Optional[str] = Header(None)):
+    row = await async_crud.get_receipt_details(session, receipt_id)
+    if not row:
+        raise HTTPException(status_code=404, detail="Receipt not found.")
+    rec, tx, user = row
+    key = receipt_cache_key(tx, user)
+    headers = receipt_headers(receipt_id, key)
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    # cache disk reads and ReportLab are blocking: keep them off the event loop
+    pdf_bytes = await run_in_threadpool(receipt_cache.get, key)
+    if pdf_bytes is None:
+        pdf_bytes = await run_in_threadpool(generate_receipt_pdf, tx, user)
+        await run_in_threadpool(receipt_cache.put, key, pdf_bytes)
+    return Response(content=pdf_bytes, media_type="application/pdf", headers=headers)
+
+@router.get("/receipts/export")
+async def export_receipts(phone: str, start: date, end: date, format: str = Query("zip", pattern="^(zip|pdf)$"),
+                          session: AsyncSession = Depends(get_async_session)):
+    if await async_crud.get_user_by_phone(session, phone) is None:
+        raise HTTPException(status_code=404, detail="User not found.")
+    # the body is a sync generator with its own session; Starlette iterates it in the threadpool
+    return export_response(phone, start, end, format)
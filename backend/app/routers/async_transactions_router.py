@@ -0,0 +1,35 @@
+# app/routers/async_transactions_router.py
+# Async twin of transactions_router.py, mounted instead of it when DB_ASYNC=true.
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlmodel.ext.asyncio.session import AsyncSession
+from ..database import get_async_session
+from .. import async_crud
+from typing import List, Optional
+from datetime import date, datetime
+from ..schemas import TransactionOut
+from .transactions_router import build_summary, summary_range
+
+router = APIRouter(prefix="/api/transactions", tags=["transactions"])
+
+@router.get("/by-phone/{phone}", response_model=List[TransactionOut])
+async def get_transactions_by_phone(phone: str, response: Response, session: AsyncSession = Depends(get_async_session),
+                                    limit: int = Query(50, ge=1, le=500), cursor: Optional[str] = None,
+                                    start: Optional[datetime] = None, end: Optional[datetime] = None,
+                                    tx_type: Optional[str] = None):
+    try:
+        rows, next_cursor = await async_crud.get_transactions_page(session, phone, limit=limit, cursor=cursor,
+                                                                   start=start, end=end, tx_type=tx_type)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return [row._asdict() for row in rows]
+
+@router.get("/summary", response_model=dict)
+async def get_summary(phone: str, start: Optional[date] = None, end: Optional[date] = None,
+                      session: AsyncSession = Depends(get_async_session)):
+    start, end = summary_range(start, end)
+    result = await async_crud.get_daily_summary(session, phone, start, end)
+    if result is None:
+        raise HTTPException(status_code=404, detail="User not found.")
+    return build_summary(phone, start, end, *result)
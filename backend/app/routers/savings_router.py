@@ -1,18 +1,28 @@
 # app/routers/savings_router.py
 from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session, select
+from sqlmodel import Session
 from ..database import get_session
 from .. import crud
 from ..schemas import SavingsContribute
+from ..utils.savings_batcher import savings_batcher
 
 router = APIRouter(prefix="/api/savings", tags=["savings"])
 
 @router.post("/contribute")
 def contribute(payload: SavingsContribute, session: Session = Depends(get_session)):
-    # get user
-    stmt = select(crud.models.User).where(crud.models.User.phone == payload.user_phone)
-    user = session.exec(stmt).first()
+    user = crud.get_user_by_phone(session, payload.user_phone)
     if not user:
         raise HTTPException(status_code=404, detail="User not found.")
-    goal = crud.contribute_savings(session, user_id=user.id, amount=payload.amount, goal_id=payload.goal_id)
-    return {"goal_id": goal.id, "current_amount": goal.current_amount, "target": goal.target_amount}
+    if savings_batcher is not None:
+        goal_id = crud.resolve_savings_goal(session, user.id, payload.goal_id)
+        if goal_id is None:
+            raise HTTPException(status_code=404, detail="Savings goal not found.")
+        session.commit()  # a newly created default goal must be visible to the batch writer
+        goal = savings_batcher.contribute(goal_id, user.id, payload.amount)
+    else:
+        goal = crud.contribute_savings(session, user_id=user.id, amount=payload.amount, goal_id=payload.goal_id)
+        session.commit()
+    if goal is None:
+        raise HTTPException(status_code=404, detail="Savings goal not found.")
+    goal_id, current_amount, target = goal
+    return {"goal_id": goal_id, "current_amount": current_amount, "target": target}
@@ -1,49 +1,243 @@
 # app/routers/sms_router.py
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
 from sqlmodel import Session
 from ..database import get_session
-from ..schemas import SMSIn, TransactionOut
+from ..schemas import SMSIn, SMSBatchIn, TransactionOut
 from .. import crud, utils
+from ..utils.sms_engine import classify, classify_many
 from ..utils.sms_parser import parse_mpesa_sms
-from ..utils.fraud_detector import score_sms_for_fraud, is_flagged
-from ..utils.receipt_generator import generate_receipt_pdf
-from fastapi.responses import StreamingResponse, JSONResponse
-from io import BytesIO
+from ..utils.fraud_detector import score_features
+from ..utils.receipt_generator import generate_receipt_pdf, receipt_cache_key
+from ..utils.pdf_cache import receipt_cache, etag_matches
+from ..utils.receipt_export import stream_receipts_pdf, stream_receipts_zip
+from ..utils.idempotency import IdempotencyKeyReusedError, idempotency_store, request_hash, request_key
+from ..utils.post_ingest import post_ingest, run_job
+from ..utils.metrics import timed
+from fastapi.responses import Response, StreamingResponse, JSONResponse
+from typing import Optional
+from datetime import date
+import json
+import re
 
 router = APIRouter(prefix="/api/sms", tags=["sms"])
 
 @router.post("/parse", response_model=dict)
-def parse_sms(payload: SMSIn, session: Session = Depends(get_session)):
+def parse_sms(payload: SMSIn, session: Session = Depends(get_session),
+              idempotency_key: Optional[str] = Header(None)):
     """
-    Accepts { phone, text } — parses M-Pesa SMS, logs a transaction, creates receipt and fraud alert.
-    Returns transaction info + suggested save amount + fraud info.
+    Accepts { phone, text } — parses M-Pesa SMS and logs a transaction.
+    Returns transaction info + suggested save amount. The receipt and fraud alert are made in the
+    background (status "pending"; poll /status/{transaction_id}), or before responding when
+    POST_INGEST_MODE=inline.
+    A retry (same Idempotency-Key header, or same phone + SMS text) gets the first response back.
     """
-    parsed = parse_mpesa_sms(payload.text)
+    return ingest_sms(session, payload.phone, payload.text, idempotency_key)
+
+@router.post("/parse/batch", response_model=dict)
+def parse_sms_batch(payload: SMSBatchIn, session: Session = Depends(get_session)):
+    """
+    Accepts { items: [{ phone, text }, ...] } — same as /parse but for many messages.
+    All rows are written in one DB transaction. Returns per-item results and errors (by index).
+    """
+    return ingest_batch(session, payload.items)
+
+@router.get("/dedup/stats", response_model=dict)
+def dedup_stats():
+    """
+    Idempotency hit rate: retries answered from memory / from the DB, and first-time requests.
+    """
+    return idempotency_store.stats()
+
+@router.get("/status/{transaction_id}", response_model=dict)
+def post_ingest_status(transaction_id: int, session: Session = Depends(get_session)):
+    """
+    Progress of the receipt + fraud alert for a transaction from /parse: pending / running / done / failed.
+    """
+    return build_status(transaction_id, crud.get_post_ingest_status(session, transaction_id))
+
+@router.get("/pipeline/stats", response_model=dict)
+def pipeline_stats():
+    return post_ingest.stats()
+
+def build_status(transaction_id: int, row):
+    if row is None:
+        raise HTTPException(status_code=404, detail="No post-ingest job for this transaction.")
+    job, alert = row
+    return {
+        "transaction_id": transaction_id,
+        "status": job.status,
+        "attempts": job.attempts,
+        "receipt_id": job.receipt_id,
+        "fraud": {
+            "score": alert.score,
+            "flagged": alert.flagged,
+            "alert_id": alert.id
+        } if alert is not None else None,
+        "error": job.error,
+    }
+
+def lookup_ingested(session: Session, key: str, body_hash: str):
+    try:
+        return idempotency_store.lookup(session, key, body_hash)
+    except IdempotencyKeyReusedError:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different SMS.")
+
+def ingest_sms(session: Session, phone: str, text: str, idempotency_key: Optional[str] = None):
+    """
+    The /parse flow on a sync session; the async router runs it through AsyncSession.run_sync.
+    """
+    # classify once; the amount and parsed fields come from the same pass
+    with timed("parse"):
+        features = classify(text)
+        parsed = parse_mpesa_sms(text, features)
     amount = parsed.get("amount")
     if amount is None:
         raise HTTPException(status_code=400, detail="Could not parse amount from SMS.")
 
+    # a retry gets the original response, without writes
+    key = request_key(phone, text, idempotency_key)
+    body_hash = request_hash(phone, text)
+    seen = lookup_ingested(session, key, body_hash)
+    if seen is not None:
+        return seen
+    try:
+        claim = crud.claim_ingest_key(session, key, body_hash)
+    except crud.DuplicateIngestKeyError:
+        # a concurrent retry of this request committed first
+        seen = lookup_ingested(session, key, body_hash)
+        if seen is None:
+            raise HTTPException(status_code=409, detail="Request is already being processed.")
+        return seen
+
     # get or create user
-    user = crud.get_or_create_user(session, phone=payload.phone)
+    user = crud.get_or_create_user(session, phone=phone)
+
+    # create transaction (409 if this M-Pesa code was already forwarded)
+    try:
+        tx = crud.create_transaction(session, user_id=user.id, amount=amount,
+                                     currency="KES", tx_type=parsed.get("tx_type"),
+                                     source=parsed.get("source"), raw_sms=text,
+                                     **{k: parsed[k] for k in crud.DETAIL_FIELDS})
+    except crud.DuplicateTransactionError as e:
+        raise HTTPException(status_code=409, detail=str(e))
 
-    # create transaction
-    tx = crud.create_transaction(session, user_id=user.id, amount=amount,
-                                 currency="KES", tx_type=parsed.get("tx_type"),
-                                 source=parsed.get("source"), raw_sms=payload.text)
+    # receipt + fraud alert: queued for the post-ingest workers unless running inline
+    job = crud.create_post_ingest_job(session, transaction_id=tx.id)
+    if post_ingest.inline:
+        job.attempts = 1
+        receipt, fa = run_job(session, job, tx)
+        result = build_result(tx, receipt.id, fa.score, fa.flagged, fa.id)
+    else:
+        result = build_result(tx, status="pending")
+    claim.response = json.dumps(result)
 
-    # create receipt record
-    receipt = crud.create_receipt(session, transaction_id=tx.id)
+    # one commit for key, user, transaction and job (+ receipt and fraud alert when inline)
+    session.commit()
+    idempotency_store.remember(key, body_hash, result)
+    if not post_ingest.inline:
+        post_ingest.submit([job.id])
+    return result
 
-    # run fraud detection
-    score = score_sms_for_fraud(payload.text)
-    flagged = is_flagged(score)
-    fa = crud.create_fraud_alert(session, user_id=user.id, sms_text=payload.text, score=score, flagged=flagged)
+def ingest_batch(session: Session, items):
+    """
+    The /parse/batch flow on a sync session (see ingest_sms). Items already ingested
+    (same phone + SMS text) get their original result back.
+    """
+    rows, indexes, errors = prepare_batch_rows(items)
+    seen = idempotency_store.lookup_many(session, {r["key"] for r in rows})
+    results = []
+    new_rows, new_indexes, repeats = [], [], []
+    first_index = {}
+    for idx, row in zip(indexes, rows):
+        key = row["key"]
+        if key in seen:
+            results.append(dict(seen[key], index=idx))
+        elif key in first_index:
+            repeats.append((idx, key))
+        else:
+            first_index[key] = idx
+            new_rows.append(row)
+            new_indexes.append(idx)
+
+    if new_rows:
+        try:
+            records = crud.create_sms_records_bulk(session, new_rows)
+        except crud.DuplicateTransactionError as e:
+            # lost a race with a concurrent forward of the same SMS; the client can retry the batch
+            raise HTTPException(status_code=409, detail=str(e))
+        new_results = build_batch_results(new_indexes, records, errors)
+        by_index = {res["index"]: res for res in new_results}
+        responses = {}
+        for row, idx in zip(new_rows, new_indexes):
+            if idx in by_index:
+                responses[row["key"]] = {k: v for k, v in by_index[idx].items() if k != "index"}
+        try:
+            crud.add_ingest_keys(session, {k: json.dumps(v) for k, v in responses.items()})
+        except crud.DuplicateIngestKeyError:
+            raise HTTPException(status_code=409, detail="Batch overlaps a request that is being processed; retry.")
+        session.commit()
+        for key, response in responses.items():
+            idempotency_store.remember(key, key, response)
+        results.extend(new_results)
+        # a repeat gets the outcome of its first copy: the same result, or the same error
+        errors_by_index = {e["index"]: e for e in errors}
+        for idx, key in repeats:
+            if key in responses:
+                results.append(dict(responses[key], index=idx))
+            else:
+                errors.append(dict(errors_by_index[first_index[key]], index=idx))
+
+    results.sort(key=lambda r: r["index"])
+    errors.sort(key=lambda e: e["index"])
+    return {"results": results, "errors": errors}
+
+def prepare_batch_rows(items):
+    """
+    Parses + scores each item. Returns (rows for crud.create_sms_records_bulk, their indexes, errors).
+    """
+    rows, indexes, errors = [], [], []
+    all_features = classify_many(item.text for item in items)
+    for idx, (item, features) in enumerate(zip(items, all_features)):
+        parsed = parse_mpesa_sms(item.text, features)
+        amount = parsed.get("amount")
+        if amount is None:
+            errors.append({"index": idx, "detail": "Could not parse amount from SMS."})
+            continue
+        score = score_features(features)
+        rows.append({
+            "phone": item.phone,
+            "amount": amount,
+            "tx_type": parsed.get("tx_type"),
+            "source": parsed.get("source"),
+            "raw_sms": item.text,
+            "score": score,
+            "key": request_key(item.phone, item.text),
+            **{k: parsed[k] for k in crud.DETAIL_FIELDS},
+        })
+        indexes.append(idx)
+    return rows, indexes, errors
 
+def build_batch_results(indexes, records, errors):
+    results = []
+    for idx, record in zip(indexes, records):
+        if record is None:
+            errors.append({"index": idx, "detail": "Duplicate M-Pesa transaction."})
+            continue
+        tx, receipt, fa = record
+        res = build_result(tx, receipt.id, fa.score, fa.flagged, fa.id)
+        res["index"] = idx
+        results.append(res)
+    return results
+
+def build_result(tx, receipt_id=None, score=None, flagged=None, alert_id=None, status="done"):
+    """
+    A pending result (also what a retry of the request gets back) points to its status endpoint.
+    """
     # generate saving nudge (simple heuristic)
-    suggested_pct = 0.1 if amount >= 500 else 0.05
-    suggested_save = round(amount * suggested_pct, 2)
+    suggested_pct = 0.1 if tx.amount >= 500 else 0.05
+    suggested_save = round(tx.amount * suggested_pct, 2)
 
-    res = {
+    result = {
         "transaction": {
             "id": tx.id,
             "amount": tx.amount,
@@ -51,25 +245,70 @@ def parse_sms(payload: SMSIn, session: Session = Depends(get_session)):
             "tx_type": tx.tx_type,
             "source": tx.source,
             "timestamp": str(tx.timestamp),
+            "mpesa_code": tx.mpesa_code,
+            "counterparty_name": tx.counterparty_name,
+            "counterparty_phone": tx.counterparty_phone,
+            "balance": tx.balance,
+            "event_time": str(tx.event_time) if tx.event_time else None,
         },
-        "receipt_id": receipt.id,
+        "receipt_id": receipt_id,
         "fraud": {
             "score": score,
             "flagged": flagged,
-            "alert_id": fa.id
-        },
-        "suggested_save": suggested_save
+            "alert_id": alert_id
+        } if alert_id is not None else None,
+        "suggested_save": suggested_save,
+        "status": status,
     }
-    return res
+    if status != "done":
+        result["status_url"] = f"/api/sms/status/{tx.id}"
+    return result
 
 @router.get("/receipt/{receipt_id}/pdf")
-def get_receipt_pdf(receipt_id: int, session: Session = Depends(get_session)):
-    # fetch receipt & transaction & user
-    rec = session.get(crud.models.Receipt, receipt_id)
-    if not rec:
+def get_receipt_pdf(receipt_id: int, session: Session = Depends(get_session),
+                    if_none_match: Optional[str] = Header(None)):
+    # fetch receipt & transaction & user (one joined query)
+    row = crud.get_receipt_details(session, receipt_id)
+    if not row:
         raise HTTPException(status_code=404, detail="Receipt not found.")
-    tx = session.get(crud.models.Transaction, rec.transaction_id)
-    user = session.get(crud.models.User, tx.user_id)
-    pdf_bytes = generate_receipt_pdf(tx, user)
-    return StreamingResponse(BytesIO(pdf_bytes), media_type="application/pdf",
-                             headers={"Content-Disposition": f"attachment; filename=receipt_{receipt_id}.pdf"})
+    rec, tx, user = row
+    key = receipt_cache_key(tx, user)
+    headers = receipt_headers(receipt_id, key)
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    pdf_bytes = receipt_cache.get(key)
+    if pdf_bytes is None:
+        pdf_bytes = generate_receipt_pdf(tx, user)
+        receipt_cache.put(key, pdf_bytes)
+    return Response(content=pdf_bytes, media_type="application/pdf", headers=headers)
+
+def receipt_headers(receipt_id: int, key: str):
+    return {
+        "ETag": f'"{key}"',
+        # receipts never change; private because they carry the user's details
+        "Cache-Control": "private, max-age=31536000, immutable",
+        "Content-Disposition": f"attachment; filename=receipt_{receipt_id}.pdf",
+    }
+
+@router.get("/receipts/export")
+def export_receipts(phone: str, start: date, end: date, format: str = Query("zip", pattern="^(zip|pdf)$"),
+                    session: Session = Depends(get_session)):
+    """
+    All receipts of a user between start and end (inclusive dates), streamed as a ZIP of PDFs
+    or one multi-page PDF (format=pdf).
+    """
+    if crud.get_user_by_phone(session, phone) is None:
+        raise HTTPException(status_code=404, detail="User not found.")
+    return export_response(phone, start, end, format)
+
+def export_response(phone: str, start: date, end: date, format: str):
+    # the phone comes from the query string: keep only safe characters in the quoted header value
+    safe_phone = re.sub(r"[^0-9A-Za-z+_-]", "_", phone)
+    filename = f"receipts_{safe_phone}_{start}_{end}.{format}"
+    if format == "pdf":
+        body, media_type = stream_receipts_pdf(phone, start, end), "application/pdf"
+    else:
+        body, media_type = stream_receipts_zip(phone, start, end), "application/zip"
+    return StreamingResponse(body, media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
@@ -1,19 +1,71 @@
 # app/routers/transactions_router.py
-from fastapi import APIRouter, Depends, Query
-from sqlmodel import Session, select
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlmodel import Session
 from ..database import get_session
-from ..models import Transaction, User
-from typing import List
+from .. import crud
+from typing import List, Optional
+from datetime import date, datetime, timedelta
 from ..schemas import TransactionOut
 
 router = APIRouter(prefix="/api/transactions", tags=["transactions"])
 
 @router.get("/by-phone/{phone}", response_model=List[TransactionOut])
-def get_transactions_by_phone(phone: str, session: Session = Depends(get_session), limit: int = Query(50)):
-    stmt = select(User).where(User.phone == phone)
-    user = session.exec(stmt).first()
-    if not user:
-        return []
-    stmt2 = select(Transaction).where(Transaction.user_id == user.id).order_by(Transaction.timestamp.desc()).limit(limit)
-    rows = session.exec(stmt2).all()
-    return rows
+def get_transactions_by_phone(phone: str, response: Response, session: Session = Depends(get_session),
+                              limit: int = Query(50, ge=1, le=500), cursor: Optional[str] = None,
+                              start: Optional[datetime] = None, end: Optional[datetime] = None,
+                              tx_type: Optional[str] = None):
+    """
+    Newest first. If there are more rows, the X-Next-Cursor header holds the cursor for the next page.
+    start (inclusive) / end (exclusive) filter on the transaction timestamp.
+    """
+    try:
+        rows, next_cursor = crud.get_transactions_page(session, phone, limit=limit, cursor=cursor,
+                                                       start=start, end=end, tx_type=tx_type)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return [row._asdict() for row in rows]
+
+@router.get("/summary", response_model=dict)
+def get_summary(phone: str, start: Optional[date] = None, end: Optional[date] = None,
+                session: Session = Depends(get_session)):
+    """
+    Income/spend totals by tx_type and per day for [start, end] (inclusive, default: last 30 days),
+    plus savings progress. Served from the DailyAggregate table, so the cost grows with days, not transactions.
+    """
+    start, end = summary_range(start, end)
+    result = crud.get_daily_summary(session, phone, start, end)
+    if result is None:
+        raise HTTPException(status_code=404, detail="User not found.")
+    return build_summary(phone, start, end, *result)
+
+def summary_range(start: Optional[date], end: Optional[date]):
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=29)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end.")
+    return start, end
+
+def build_summary(phone: str, start: date, end: date, days, goals):
+    totals = {}
+    per_day = []
+    for day, tx_type, amount, count in days:
+        t = totals.setdefault(tx_type, {"amount": 0.0, "count": 0})
+        t["amount"] += amount
+        t["count"] += count
+        per_day.append({"day": str(day), "tx_type": tx_type, "amount": amount, "count": count})
+    income = totals.get("RECEIVE", {}).get("amount", 0.0)
+    spend = totals.get("SEND", {}).get("amount", 0.0)
+    return {
+        "phone": phone,
+        "start": str(start),
+        "end": str(end),
+        "income": round(income, 2),
+        "spend": round(spend, 2),
+        "net": round(income - spend, 2),
+        "totals": totals,
+        "days": per_day,
+        "savings": [{"goal_id": g.id, "name": g.name, "current_amount": g.current_amount, "target": g.target_amount}
+                    for g in goals],
+    }
@@ -1,5 +1,5 @@
 # app/schemas.py
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime
 
@@ -7,6 +7,9 @@ class SMSIn(BaseModel):
     phone: str
     text: str
 
+class SMSBatchIn(BaseModel):
+    items: List[SMSIn] = Field(..., min_length=1, max_length=1000)
+
 class TransactionCreate(BaseModel):
     user_phone: str
     amount: float
@@ -22,6 +25,11 @@ class TransactionOut(BaseModel):
     tx_type: Optional[str]
     source: Optional[str]
     timestamp: datetime
+    mpesa_code: Optional[str] = None
+    counterparty_name: Optional[str] = None
+    counterparty_phone: Optional[str] = None
+    balance: Optional[float] = None
+    event_time: Optional[datetime] = None
 
     class Config:
         orm_mode = True
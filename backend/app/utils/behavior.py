@@ -0,0 +1,247 @@
+# app/utils/behavior.py
+"""
+Per-user behavioural fraud signals, added on top of the keyword score of fraud_detector.
+
+Each user has a profile of their last BEHAVIOR_WINDOW transactions with running sums, so the
+features are read without touching the DB:
+  * amount mean / standard deviation (is this amount far outside the user's usual?)
+  * message rate: transactions in the BURST_WINDOW before this one, by the time stated in the
+    SMS (event_time; the ingest time when the SMS has none), so a phone forwarding its backlog
+    of old messages at once is not a burst
+  * new-counterparty rate: share of recent transactions with someone not seen before in the window
+
+Profiles live in a bounded LRU with a TTL. create_transaction adds each new transaction to its
+user's profile (observe); a profile that is missing or expired is rebuilt from the user's latest
+transactions on first use. If the DB transaction that added rows rolls back, the profiles it
+touched are dropped and rebuilt on next use.
+
+A transaction is scored against the history before it (rows with a lower id). The cache is per
+process and only sees the transactions that process created, so with several API workers a
+cached profile can miss other processes' rows until its TTL runs out. Background post-ingest
+jobs (which may run in another process, e.g. app.jobs.post_ingest_worker) therefore score from
+a profile rebuilt from the DB (refresh=True); inline and batch scoring use the cache.
+
+BEHAVIOR_WINDOW       transactions kept per user (default 50)
+BEHAVIOR_CACHE_SIZE   profiles kept in memory (default 100000)
+BEHAVIOR_CACHE_TTL    seconds before a profile is rebuilt from the DB (default 3600)
+"""
+import math
+import os
+import threading
+import time
+from collections import deque
+from datetime import timedelta
+from typing import Dict, Iterable, NamedTuple, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session as _Session
+from sqlmodel import Session, select
+
+from ..models import Transaction
+from .lru import LRUCache
+
+WINDOW = int(os.getenv("BEHAVIOR_WINDOW", "50"))
+CACHE_SIZE = int(os.getenv("BEHAVIOR_CACHE_SIZE", "100000"))
+CACHE_TTL = float(os.getenv("BEHAVIOR_CACHE_TTL", "3600"))
+
+BURST_WINDOW = timedelta(minutes=10)
+BURST_COUNT = 5            # this many messages in BURST_WINDOW before this one is a burst
+MIN_HISTORY = 5            # amount / counterparty signals need this much history
+AMOUNT_RATIO = 10.0        # amount >= 10x the user's mean ...
+AMOUNT_Z = 4.0             # ... or 4 standard deviations above it
+NEW_COUNTERPARTY_RATE = 0.5
+
+_TOUCHED = "behavior_profiles_touched"
+
+
+class BehaviorFeatures(NamedTuple):
+    history: int                  # transactions before this one in the window
+    amount_mean: float
+    amount_std: float
+    amount_ratio: float           # amount / mean (0 without history)
+    amount_z: float
+    recent_count: int             # transactions in BURST_WINDOW before this one
+    new_counterparty: bool
+    new_counterparty_rate: float  # share of the window's transactions that had a new counterparty
+
+
+class _Entry(NamedTuple):
+    id: int
+    when: object  # event_time, or timestamp without one
+    amount: float
+    counterparty: Optional[str]
+    new: bool
+
+
+def _counterparty(tx) -> Optional[str]:
+    return tx.counterparty_phone or tx.counterparty_name
+
+
+def _when(tx):
+    return tx.event_time or tx.timestamp
+
+
+class BehaviorProfile:
+    """
+    Sliding window of one user's transactions with running sums; add() is O(1).
+    """
+    __slots__ = ("entries", "ids", "counterparties", "total", "total_sq", "new_count", "expires")
+
+    def __init__(self, ttl: float):
+        self.entries = deque()
+        self.ids = set()
+        self.counterparties: Dict[str, int] = {}
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.new_count = 0
+        self.expires = time.monotonic() + ttl
+
+    def add(self, tx_id: int, when, amount: float, counterparty: Optional[str]):
+        if tx_id in self.ids:
+            return
+        new = counterparty is not None and counterparty not in self.counterparties
+        self.entries.append(_Entry(tx_id, when, amount, counterparty, new))
+        self.ids.add(tx_id)
+        self._count(amount, counterparty, new, 1)
+        if len(self.entries) > WINDOW:
+            old = self.entries.popleft()
+            self.ids.discard(old.id)
+            self._count(old.amount, old.counterparty, old.new, -1)
+
+    def _count(self, amount: float, counterparty: Optional[str], new: bool, sign: int):
+        self.total += sign * amount
+        self.total_sq += sign * amount * amount
+        self.new_count += sign * new
+        if counterparty is not None:
+            n = self.counterparties.get(counterparty, 0) + sign
+            if n:
+                self.counterparties[counterparty] = n
+            else:
+                del self.counterparties[counterparty]
+
+    def features(self, tx) -> BehaviorFeatures:
+        """
+        Features of tx against the entries before it (lower id). Entries at or after tx (usually
+        just tx itself, once observed) are taken back out of the running sums.
+        Event times are not in id order (a backlog arrives late), so the burst count scans the window.
+        """
+        total, total_sq, new_count, n = self.total, self.total_sq, self.new_count, len(self.entries)
+        later_counterparties = {}
+        recent = 0
+        when = _when(tx)
+        since = when - BURST_WINDOW
+        for e in self.entries:
+            if e.id >= tx.id:
+                total -= e.amount
+                total_sq -= e.amount * e.amount
+                new_count -= e.new
+                n -= 1
+                if e.counterparty is not None:
+                    later_counterparties[e.counterparty] = later_counterparties.get(e.counterparty, 0) + 1
+            elif since <= e.when <= when:
+                recent += 1
+
+        counterparty = _counterparty(tx)
+        known = (counterparty is not None
+                 and self.counterparties.get(counterparty, 0) > later_counterparties.get(counterparty, 0))
+        if n == 0:
+            return BehaviorFeatures(0, 0.0, 0.0, 0.0, 0.0, recent, counterparty is not None, 0.0)
+        mean = total / n
+        std = math.sqrt(max(total_sq / n - mean * mean, 0.0))
+        ratio = tx.amount / mean if mean > 0 else 0.0
+        z = (tx.amount - mean) / std if std > 0 else 0.0
+        return BehaviorFeatures(n, mean, std, ratio, z, recent,
+                                counterparty is not None and not known, new_count / n)
+
+
+def score_behavior(f: BehaviorFeatures) -> float:
+    """
+    0.0 - 1.0, added to the keyword score. Rule-based like score_features.
+    """
+    score = 0.0
+    # a burst of messages in a few minutes
+    if f.recent_count >= BURST_COUNT:
+        score += 0.3
+    if f.history >= MIN_HISTORY:
+        # amount far outside the user's usual
+        if f.amount_ratio >= AMOUNT_RATIO or f.amount_z >= AMOUNT_Z:
+            score += 0.4
+        # another stranger while many recent transactions were with strangers
+        if f.new_counterparty and f.new_counterparty_rate >= NEW_COUNTERPARTY_RATE:
+            score += 0.2
+    return min(score, 1.0)
+
+
+class BehaviorProfiles:
+    def __init__(self, max_size: int = CACHE_SIZE, ttl: float = CACHE_TTL):
+        self.ttl = ttl
+        self.cache = LRUCache(max_size)
+        self.rebuilds = 0
+        self._lock = threading.Lock()
+
+    def _profile(self, session: Session, user_id: int, refresh: bool = False) -> BehaviorProfile:
+        profile = None if refresh else self.cache.get(user_id)
+        if profile is not None and profile.expires > time.monotonic():
+            return profile
+        # miss, expired or refresh (rebuilt outside the lock; a racing rebuild just does the same work):
+        # the user's latest WINDOW transactions, oldest first
+        # (served by ix_transaction_user_id_timestamp_id)
+        stmt = (select(Transaction.id, Transaction.timestamp, Transaction.event_time, Transaction.amount,
+                       Transaction.counterparty_phone, Transaction.counterparty_name)
+                .where(Transaction.user_id == user_id)
+                .order_by(Transaction.timestamp.desc(), Transaction.id.desc())
+                .limit(WINDOW))
+        rows = session.exec(stmt).all()
+        profile = BehaviorProfile(self.ttl)
+        for row in reversed(rows):
+            profile.add(row.id, _when(row), row.amount, _counterparty(row))
+        self.cache.put(user_id, profile)
+        self.rebuilds += 1
+        return profile
+
+    def observe(self, session: Session, txs: Iterable):
+        """
+        Adds flushed transactions to their users' profiles. Call in the session that wrote them.
+        """
+        touched = session.info.setdefault(_TOUCHED, set())
+        for tx in txs:
+            profile = self._profile(session, tx.user_id)
+            with self._lock:
+                profile.add(tx.id, _when(tx), tx.amount, _counterparty(tx))
+            touched.add(tx.user_id)
+
+    def features(self, session: Session, tx, refresh: bool = False) -> BehaviorFeatures:
+        """
+        refresh: rebuild the profile from the DB instead of trusting this process's cache.
+        """
+        profile = self._profile(session, tx.user_id, refresh)
+        with self._lock:
+            return profile.features(tx)
+
+    def score(self, session: Session, tx, refresh: bool = False) -> float:
+        return score_behavior(self.features(session, tx, refresh))
+
+    def discard(self, user_ids: Iterable[int]):
+        for user_id in user_ids:
+            self.cache.pop(user_id)
+
+    def stats(self) -> dict:
+        return {"profiles": len(self.cache), "hits": self.cache.hits, "misses": self.cache.misses,
+                "rebuilds": self.rebuilds}
+
+
+behavior_profiles = BehaviorProfiles()
+
+
+@event.listens_for(_Session, "after_commit")
+def _keep_profiles(session):
+    session.info.pop(_TOUCHED, None)
+
+
+@event.listens_for(_Session, "after_transaction_end")
+def _drop_uncommitted_profiles(session, transaction):
+    # not committed (rollback or close): the profiles may hold rows that were never written
+    if transaction.parent is None:
+        touched = session.info.pop(_TOUCHED, None)
+        if touched:
+            behavior_profiles.discard(touched)
@@ -1,34 +1,32 @@
 # app/utils/fraud_detector.py
-from typing import Dict
 import re
+from .sms_engine import URL_PATTERN, SMSFeatures, classify
 
-PHISHING_KEYWORDS = [
-    "loan", "loan offer", "click", "link", "verify", "login", "update", "account suspended",
-    "confirm", "pay now", "pay immediately", "urgent"
-]
-
-SHORT_URL_RE = re.compile(r"https?://\S+|bit\.ly/\S+|tinyurl\.com/\S+", re.IGNORECASE)
+SHORT_URL_RE = re.compile(URL_PATTERN, re.IGNORECASE)
 
 def score_sms_for_fraud(text: str) -> float:
     """
     Returns a 0.0 - 1.0 score. Higher means more suspicious.
     This is a simple rule-based heuristic—replace with ML later.
     """
+    return score_features(classify(text))
+
+def score_features(features: SMSFeatures) -> float:
+    """
+    Same score as score_sms_for_fraud, from an already classified SMS.
+    """
     score = 0.0
-    t = text.lower()
 
     # URL presence is suspicious by default
-    if SHORT_URL_RE.search(t):
+    if features.has_url:
         score += 0.5
 
     # Keywords
-    for kw in PHISHING_KEYWORDS:
-        if kw in t:
-            score += 0.2
+    for _ in features.keywords:
+        score += 0.2
 
     # Too many numbers (maybe an OTP or weird message)
-    digits = sum(c.isdigit() for c in t)
-    if digits > 15:
+    if features.digit_count > 15:
         score += 0.2
 
     # clamp
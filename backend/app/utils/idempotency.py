@@ -0,0 +1,115 @@
+# app/utils/idempotency.py
+"""
+Idempotent SMS ingestion. Every /api/sms/parse request gets a key: the Idempotency-Key header,
+or (when the device doesn't send one) a hash of the phone and the normalized SMS text.
+
+Keys of recent requests are kept in a bounded in-process LRU with the response that was sent;
+older ones are found through the IngestKey table, whose primary key is also what stops two
+concurrent retries from both writing. A duplicate gets the original response back without writes.
+Each key is stored with request_hash() of its body: reusing an Idempotency-Key for a different
+SMS raises IdempotencyKeyReusedError (422) instead of replaying the first response.
+IngestKey rows are purged after IDEMPOTENCY_RETENTION_DAYS by app.jobs.purge_ingest_keys.
+
+IDEMPOTENCY_CACHE_SIZE      number of keys kept in memory (default 100000)
+IDEMPOTENCY_RETENTION_DAYS  age after which IngestKey rows are purged (default 7)
+"""
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlmodel import Session, select
+
+from ..models import IngestKey
+from .lru import LRUCache
+
+
+def request_hash(phone: str, text: str) -> str:
+    """
+    Hash of the phone and the normalized SMS text: the key of a request without an Idempotency-Key.
+    """
+    normalized = " ".join(text.lower().split())
+    return hashlib.sha256(f"s\x1f{phone.strip()}\x1f{normalized}".encode()).hexdigest()
+
+
+def request_key(phone: str, text: str, idempotency_key: Optional[str] = None) -> str:
+    if idempotency_key:
+        # scoped to the phone so two devices can't collide on a client-chosen key
+        raw = f"h\x1f{phone.strip()}\x1f{idempotency_key.strip()}"
+        return hashlib.sha256(raw.encode()).hexdigest()
+    return request_hash(phone, text)
+
+
+class IdempotencyKeyReusedError(Exception):
+    """
+    The Idempotency-Key was already used for a request with a different body.
+    """
+
+
+class IdempotencyStore:
+    def __init__(self, max_size: int):
+        self.cache = LRUCache(max_size)
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, session: Session, key: str, body_hash: str = "") -> Optional[dict]:
+        """
+        The response stored for key, or None if this request wasn't seen before.
+        Raises IdempotencyKeyReusedError if key was stored with a body other than body_hash.
+        """
+        entry = self._lookup(session, [key]).get(key)
+        if entry is None:
+            return None
+        stored_hash, response = entry
+        # rows written before hashes were stored have none to compare
+        if body_hash and stored_hash and stored_hash != body_hash:
+            raise IdempotencyKeyReusedError(key)
+        return response
+
+    def lookup_many(self, session: Session, keys: Iterable[str]) -> Dict[str, dict]:
+        """
+        Responses stored for keys derived from the body (request_hash), so there's no body to check.
+        """
+        return {key: response for key, (_, response) in self._lookup(session, keys).items()}
+
+    def _lookup(self, session: Session, keys: Iterable[str]) -> Dict[str, Tuple[str, dict]]:
+        found, missing = {}, []
+        for key in keys:
+            entry = self.cache.get(key)
+            if entry is None:
+                missing.append(key)
+            else:
+                found[key] = entry
+        memory_hits = len(found)
+        if missing:
+            stmt = (select(IngestKey.key, IngestKey.request_hash, IngestKey.response)
+                    .where(IngestKey.key.in_(missing), IngestKey.response != ""))
+            for key, body_hash, response in session.exec(stmt).all():
+                found[key] = (body_hash, json.loads(response))
+                self.cache.put(key, found[key])
+        with self._lock:
+            self.memory_hits += memory_hits
+            self.db_hits += len(found) - memory_hits
+            self.misses += len(missing) - (len(found) - memory_hits)
+        return found
+
+    def remember(self, key: str, body_hash: str, response: dict) -> None:
+        # call after commit, so the cache never holds a response that was rolled back
+        self.cache.put(key, (body_hash, response))
+
+    def stats(self) -> dict:
+        hits = self.memory_hits + self.db_hits
+        total = hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / total, 4) if total else 0.0,
+            "cached_keys": len(self.cache),
+        }
+
+
+idempotency_store = IdempotencyStore(int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "100000")))
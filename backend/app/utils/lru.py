@@ -0,0 +1,67 @@
+# app/utils/lru.py
+"""
+Small thread-safe LRU cache used by the in-process caches (receipt PDFs, ...).
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class LRUCache:
+    """
+    max_size bounds the total weight of the entries; weigher(value) gives an entry's weight
+    (default 1, i.e. max_size is an entry count). Least recently used entries are evicted first.
+    """
+
+    def __init__(self, max_size: int, weigher: Optional[Callable[[Any], int]] = None):
+        self.max_size = max_size
+        self.weigher = weigher or (lambda value: 1)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        weight = self.weigher(value)
+        if weight > self.max_size:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.size -= self.weigher(old)
+            self._data[key] = value
+            self.size += weight
+            while self.size > self.max_size:
+                _, evicted = self._data.popitem(last=False)
+                self.size -= self.weigher(evicted)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            value = self._data.pop(key, None)
+            if value is None:
+                return default
+            self.size -= self.weigher(value)
+            return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
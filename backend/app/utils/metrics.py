@@ -0,0 +1,239 @@
+# app/utils/metrics.py
+"""
+In-process metrics, exposed in the Prometheus text format at /metrics.
+
+  http_request_duration_seconds{method,route,status}  latency per route template
+  http_request_db_queries{route}                      DB statements per request
+  http_request_db_seconds{route}                      time in DB statements per request
+  db_query_duration_seconds                           every statement (SQLAlchemy cursor events)
+  db_pool_checkout_seconds                            wait for a pooled connection
+  stage_duration_seconds{stage}                       parse / fraud_score / pdf_render
+plus gauges for the pool and the in-process caches.
+
+Recording is a perf_counter pair and a short locked counter update, so it stays on in
+production. Optional slow logs (logger "app.slow"):
+
+METRICS_ENABLED   default true
+SLOW_REQUEST_MS   log requests slower than this, with their DB stats (default 0 = off)
+SLOW_QUERY_MS     log statements slower than this (default 0 = off)
+"""
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").strip().lower() in ("1", "true", "yes", "on")
+SLOW_REQUEST = float(os.getenv("SLOW_REQUEST_MS", "0")) / 1000
+SLOW_QUERY = float(os.getenv("SLOW_QUERY_MS", "0")) / 1000
+
+slow_log = logging.getLogger("app.slow")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FAST_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._series: Dict[tuple, list] = {}   # labels -> [count per bucket (+Inf last), sum]
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value: float, *labels):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        for labels, counts, total in sorted(snapshot):
+            base = _labels(self.labelnames, labels)
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames + ('le',), labels + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{base} {total}")
+            lines.append(f"{self.name}_count{base} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """
+    Read when /metrics is scraped: fn() returns {labels tuple: value}.
+    """
+
+    def __init__(self, name: str, help: str, fn: Callable[[], Dict[tuple, float]], labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.labelnames = labelnames
+        REGISTRY.append(self)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for labels, value in sorted(self.fn().items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, escaped)) + "}"
+
+
+REGISTRY: list = []
+
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Request latency by route template.",
+                            ("method", "route", "status"))
+REQUEST_QUERIES = Histogram("http_request_db_queries", "DB statements per request.", ("route",), COUNT_BUCKETS)
+REQUEST_DB_SECONDS = Histogram("http_request_db_seconds", "Time spent in DB statements per request.", ("route",))
+QUERY_SECONDS = Histogram("db_query_duration_seconds", "DB statement duration.", buckets=FAST_BUCKETS)
+POOL_CHECKOUT_SECONDS = Histogram("db_pool_checkout_seconds", "Wait for a pooled DB connection.", buckets=FAST_BUCKETS)
+STAGE_SECONDS = Histogram("stage_duration_seconds", "Hot-path stages: parse, fraud_score, pdf_render.",
+                          ("stage",), FAST_BUCKETS)
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# -- per-request DB stats ----------------------------------------------------------------------
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+# set by MetricsMiddleware; the threadpool and run_sync greenlets see the same object
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+@contextmanager
+def timed(stage: str):
+    """
+    with timed("parse"): ...  records the block in stage_duration_seconds.
+    """
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        if METRICS_ENABLED:
+            STAGE_SECONDS.observe(time.perf_counter() - t0, stage)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    QUERY_SECONDS.observe(elapsed)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+    if SLOW_QUERY and elapsed >= SLOW_QUERY:
+        slow_log.warning("slow query %.1f ms: %s", elapsed * 1000, " ".join(statement.split())[:500])
+
+
+def _handle_error(context):
+    # the statement failed: drop its start time so the stack stays aligned
+    starts = context.connection.info.get("query_start") if context.connection is not None else None
+    if starts:
+        starts.pop()
+
+
+if METRICS_ENABLED:
+    # all engines, including the sync engine behind the async one
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(Engine, "handle_error", _handle_error)
+
+
+class _TimedCheckout:
+    def connect(self):
+        if not METRICS_ENABLED:
+            return super().connect()
+        t0 = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - t0)
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+# -- requests --------------------------------------------------------------------------------
+
+class MetricsMiddleware:
+    """
+    Plain ASGI middleware (no BaseHTTPMiddleware overhead). The route label is the matched path
+    template (/api/sms/receipt/{receipt_id}/pdf), so label cardinality stays fixed.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - t0
+            _request_stats.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            REQUEST_SECONDS.observe(elapsed, scope["method"], path, str(status))
+            REQUEST_QUERIES.observe(stats.queries, path)
+            REQUEST_DB_SECONDS.observe(stats.db_seconds, path)
+            if SLOW_REQUEST and elapsed >= SLOW_REQUEST:
+                slow_log.warning("slow request %s %s %.1f ms status %s: %d queries, %.1f ms in DB",
+                                 scope["method"], scope["path"], elapsed * 1000, status,
+                                 stats.queries, stats.db_seconds * 1000)
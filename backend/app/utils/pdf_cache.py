@@ -0,0 +1,147 @@
+# app/utils/pdf_cache.py
+"""
+Cache for generated receipt PDFs. Receipts never change once created, so the bytes are stored
+under a key derived from everything that goes into the PDF (receipt_cache_key) and served
+again without rendering: first from an in-memory LRU bounded in bytes, then from a local
+disk directory that survives restarts.
+
+The disk tier is bounded too: when the bytes written push it over its budget, the files read or
+written longest ago (by mtime, which a disk hit refreshes) are deleted until it is back under
+PRUNE_TO of the budget. The usage is counted per process and re-measured from the directory on
+every prune, so processes sharing the directory only overshoot until one of them prunes.
+
+RECEIPT_CACHE_BYTES       memory budget (default 64 MB, 0 disables the memory tier)
+RECEIPT_CACHE_DIR         disk directory (default .receipt_cache, empty disables the disk tier)
+RECEIPT_CACHE_DISK_BYTES  disk budget (default 1 GB, 0 for unbounded)
+"""
+import os
+import tempfile
+import threading
+from typing import List, Optional, Tuple
+
+from .lru import LRUCache
+
+
+PRUNE_TO = 0.9   # a prune leaves the disk tier at this share of its budget
+
+
+class ReceiptPDFCache:
+    def __init__(self, max_bytes: int, directory: Optional[str] = None, max_disk_bytes: int = 0):
+        self.memory = LRUCache(max_bytes, weigher=len)
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.disk_bytes = 0
+        self.pruned = 0
+        self._lock = threading.Lock()
+        self._prune_lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            if max_disk_bytes:
+                self.disk_bytes = sum(size for _, size, _ in self._files())
+
+    def _path(self, key: str) -> str:
+        # fan out by prefix so one directory doesn't collect millions of files
+        return os.path.join(self.directory, key[:2], key + ".pdf")
+
+    def get(self, key: str) -> Optional[bytes]:
+        data = self.memory.get(key)
+        if data is not None or not self.directory:
+            return data
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        if self.max_disk_bytes:
+            try:
+                os.utime(path)   # recently used: pruned last
+            except OSError:
+                pass
+        self.memory.put(key, data)
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        self.memory.put(key, data)
+        if not self.directory:
+            return
+        path = self._path(key)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write + rename so a concurrent reader never sees a partial file
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return
+        if self.max_disk_bytes:
+            with self._lock:
+                self.disk_bytes += len(data)
+                over = self.disk_bytes > self.max_disk_bytes
+            if over:
+                self.prune()
+
+    def _files(self) -> List[Tuple[float, int, str]]:
+        """
+        (mtime, size, path) of each PDF in the disk tier.
+        """
+        files = []
+        for sub in os.scandir(self.directory):
+            if not sub.is_dir():
+                continue
+            for entry in os.scandir(sub.path):
+                if entry.name.endswith(".pdf"):
+                    try:
+                        st = entry.stat()
+                    except OSError:   # deleted by another process meanwhile
+                        continue
+                    files.append((st.st_mtime, st.st_size, entry.path))
+        return files
+
+    def prune(self) -> int:
+        """
+        Deletes the least recently used PDFs until the disk tier is under PRUNE_TO of its budget.
+        One thread prunes at a time; others skip it. Returns the number of files deleted.
+        """
+        if not self._prune_lock.acquire(blocking=False):
+            return 0
+        try:
+            files = sorted(self._files())
+            total = sum(size for _, size, _ in files)
+            target = int(self.max_disk_bytes * PRUNE_TO)
+            deleted = 0
+            for _, size, path in files:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                deleted += 1
+            with self._lock:
+                self.disk_bytes = total
+                self.pruned += deleted
+            return deleted
+        finally:
+            self._prune_lock.release()
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    # weak comparison, as If-None-Match requires
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+receipt_cache = ReceiptPDFCache(
+    max_bytes=int(os.getenv("RECEIPT_CACHE_BYTES", str(64 * 1024 * 1024))),
+    directory=os.getenv("RECEIPT_CACHE_DIR", ".receipt_cache") or None,
+    max_disk_bytes=int(os.getenv("RECEIPT_CACHE_DISK_BYTES", str(1024 * 1024 * 1024))),
+)
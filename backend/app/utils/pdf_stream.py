@@ -0,0 +1,92 @@
+# app/utils/pdf_stream.py
+"""
+Minimal PDF writer that emits a document page by page, for streaming exports of any length.
+
+Each page's objects are returned as bytes as soon as the page is added; only the object offsets
+are kept until finish() writes the page tree, catalog and cross-reference table (a PDF may
+define its page tree after the pages). Pages are drawn from receipt_layout-style ops with the
+standard Type 1 fonts, so nothing is embedded.
+"""
+import zlib
+from typing import Iterable, List, Sequence, Tuple
+
+
+def _num(value: float) -> bytes:
+    return (b"%.2f" % value).rstrip(b"0").rstrip(b".")
+
+
+def _text(value: str) -> bytes:
+    raw = value.encode("cp1252", errors="replace")
+    return raw.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+class PdfStreamWriter:
+    def __init__(self, pagesize: Tuple[float, float], fonts: Sequence[str]):
+        self.pagesize = pagesize
+        self.fonts = {name: b"F%d" % (i + 1) for i, name in enumerate(fonts)}
+        self.offset = 0
+        self.offsets = {}          # object number -> byte offset
+        self.pages: List[int] = []
+        self._next = 3             # 1 = catalog, 2 = page tree (written by finish)
+        self._font_refs = b""
+
+    def _new(self) -> int:
+        num = self._next
+        self._next += 1
+        return num
+
+    def _obj(self, num: int, body: bytes) -> bytes:
+        data = b"%d 0 obj\n%s\nendobj\n" % (num, body)
+        self.offsets[num] = self.offset
+        self.offset += len(data)
+        return data
+
+    def start(self) -> bytes:
+        header = b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"
+        self.offset = len(header)
+        out = [header]
+        refs = []
+        for name, resource in self.fonts.items():
+            num = self._new()
+            out.append(self._obj(num, b"<< /Type /Font /Subtype /Type1 /BaseFont /%s /Encoding /WinAnsiEncoding >>"
+                                 % name.encode()))
+            refs.append(b"/%s %d 0 R" % (resource, num))
+        self._font_refs = b" ".join(refs)
+        return b"".join(out)
+
+    def _content(self, ops: Iterable[tuple]) -> bytes:
+        lines = []
+        for op in ops:
+            if op[0] == "line":
+                x1, y1, x2, y2 = (_num(v) for v in op[1:])
+                lines.append(b"%s %s m %s %s l S" % (x1, y1, x2, y2))
+            else:
+                _, font, size, x, y, text = op
+                lines.append(b"BT /%s %s Tf %s %s Td (%s) Tj ET"
+                             % (self.fonts[font], _num(size), _num(x), _num(y), _text(text)))
+        return b"\n".join(lines)
+
+    def add_page(self, ops: Iterable[tuple]) -> bytes:
+        """
+        ops: ("text", font, size, x, y, string) / ("line", x1, y1, x2, y2). Returns the page's bytes.
+        """
+        content = zlib.compress(self._content(ops))
+        content_num, page_num = self._new(), self._new()
+        width, height = (_num(v) for v in self.pagesize)
+        out = self._obj(content_num, b"<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream"
+                        % (len(content), content))
+        out += self._obj(page_num, b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %s %s] "
+                                   b"/Resources << /Font << %s >> >> /Contents %d 0 R >>"
+                         % (width, height, self._font_refs, content_num))
+        self.pages.append(page_num)
+        return out
+
+    def finish(self) -> bytes:
+        kids = b" ".join(b"%d 0 R" % num for num in self.pages)
+        out = self._obj(2, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self.pages)))
+        out += self._obj(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        size = self._next
+        xref = [b"xref\n0 %d\n0000000000 65535 f \n" % size]
+        xref.extend(b"%010d 00000 n \n" % self.offsets[num] for num in range(1, size))
+        xref.append(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, self.offset))
+        return out + b"".join(xref)
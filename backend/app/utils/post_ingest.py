@@ -0,0 +1,252 @@
+# app/utils/post_ingest.py
+"""
+Background pipeline for the part of /api/sms/parse the client doesn't wait for: fraud scoring
+with its FraudAlert, and the Receipt row.
+
+The request commits the transaction together with a PostIngestJob row (status "pending") and
+responds; GET /api/sms/status/{transaction_id} reports the job and its results. Jobs are run by
+a pool of asyncio worker tasks that do the DB work on their own threads.
+
+A worker runs a job only after claiming it with a conditional
+UPDATE ... SET status = 'running' WHERE id = :id AND status = 'pending' that matched one row, so
+a job queued by several processes (or claimed twice on SQLite, which has no row locks) still
+runs once. A job left running by a dead worker may be claimed again after POST_INGEST_LEASE_SECONDS.
+  * memory: job ids go on an in-process asyncio.Queue. Jobs left pending (or with an expired
+    lease) when a process starts are queued again from the table.
+  * db: the job table is the queue. Workers pick candidates with SELECT ... FOR UPDATE SKIP
+    LOCKED (Postgres), so API processes and `python -m app.jobs.post_ingest_worker` processes
+    can share it without waiting on each other, then claim them as above.
+  * inline: the job runs in the request before it responds (no queue).
+
+POST_INGEST_MODE           memory / db / inline (default memory)
+POST_INGEST_WORKERS        worker tasks per process (default 4; 0 with db mode leaves jobs to standalone workers)
+POST_INGEST_MAX_ATTEMPTS   tries before a job is marked failed (default 3)
+POST_INGEST_POLL_MS        db mode: how often idle workers look for new jobs (default 500)
+POST_INGEST_LEASE_SECONDS  how long a claimed job may stay running before it can be claimed again (default 60)
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional
+
+from sqlalchemy import and_, or_, update
+from sqlmodel import Session, select
+
+from .. import crud
+from ..database import engine
+from ..models import PostIngestJob, Transaction
+from .behavior import behavior_profiles
+from .fraud_detector import is_flagged, score_sms_for_fraud
+from .metrics import timed
+
+MODES = ("memory", "db", "inline")
+MODE = os.getenv("POST_INGEST_MODE", "memory").strip().lower()
+if MODE not in MODES:
+    raise RuntimeError(f"POST_INGEST_MODE must be one of {', '.join(MODES)}")
+WORKERS = int(os.getenv("POST_INGEST_WORKERS", "4"))
+MAX_ATTEMPTS = int(os.getenv("POST_INGEST_MAX_ATTEMPTS", "3"))
+POLL_INTERVAL = int(os.getenv("POST_INGEST_POLL_MS", "500")) / 1000
+LEASE = timedelta(seconds=int(os.getenv("POST_INGEST_LEASE_SECONDS", "60")))
+
+
+def run_job(session: Session, job: PostIngestJob, tx: Optional[Transaction] = None, refresh: bool = False):
+    """
+    Creates the receipt and fraud alert for job's transaction and marks it done. Does not commit.
+    The caller has counted the attempt (claim_job, or attempts=1 inline).
+    refresh: score from the user's profile rebuilt from the DB (see utils/behavior.py).
+    """
+    if tx is None:
+        tx = session.get(Transaction, job.transaction_id)
+    text = tx.raw_sms or ""
+    # keyword score + how unusual the transaction is for this user
+    with timed("fraud_score"):
+        score = min(score_sms_for_fraud(text) + behavior_profiles.score(session, tx, refresh), 1.0)
+    receipt = crud.create_receipt(session, transaction_id=tx.id)
+    alert = crud.create_fraud_alert(session, user_id=tx.user_id, sms_text=text, score=score, flagged=is_flagged(score))
+    job.status = "done"
+    job.receipt_id = receipt.id
+    job.alert_id = alert.id
+    job.error = None
+    job.updated_at = datetime.utcnow()
+    session.add(job)
+    session.flush()
+    return receipt, alert
+
+
+def _claimable(now: datetime):
+    return or_(PostIngestJob.status == "pending",
+               and_(PostIngestJob.status == "running", PostIngestJob.updated_at < now - LEASE))
+
+
+def claim_job(session: Session, job_id: int) -> bool:
+    """
+    Marks the job running and counts the attempt if it is pending (or its lease expired), in one
+    conditional UPDATE. True if this caller got it. Does not commit.
+    """
+    now = datetime.utcnow()
+    stmt = (update(PostIngestJob)
+            .where(PostIngestJob.id == job_id, _claimable(now))
+            .values(status="running", attempts=PostIngestJob.attempts + 1, updated_at=now)
+            .execution_options(synchronize_session=False))
+    return session.execute(stmt).rowcount == 1
+
+
+def execute(job_id: int, claimed: bool = False) -> Optional[bool]:
+    """
+    Runs one job in its own transaction, claiming it first unless claim_jobs already did.
+    Returns True if it failed and should be tried again, None if it wasn't this worker's to run.
+    """
+    with Session(engine, expire_on_commit=False) as session:
+        if not claimed:
+            if not claim_job(session, job_id):
+                return None  # done, failed, or another worker has it
+            session.commit()
+        job = session.get(PostIngestJob, job_id)
+        if job is None:
+            return None
+        try:
+            # maybe not the process that ingested it: don't trust the cached profile
+            run_job(session, job, refresh=True)
+            session.commit()
+            return False
+        except Exception as exc:
+            session.rollback()
+            job = session.get(PostIngestJob, job_id)
+            job.status = "failed" if job.attempts >= MAX_ATTEMPTS else "pending"
+            job.error = repr(exc)[:500]
+            job.updated_at = datetime.utcnow()
+            session.add(job)
+            session.commit()
+            return job.status == "pending"
+
+
+def claim_jobs(limit: int) -> List[int]:
+    """
+    db mode: claims up to limit pending (or lease-expired) jobs and returns their ids.
+    SKIP LOCKED lets concurrent workers pick disjoint rows without waiting on each other (Postgres);
+    SQLite ignores it, and the conditional UPDATE of claim_job keeps two workers off the same job.
+    """
+    stmt = (select(PostIngestJob.id)
+            .where(_claimable(datetime.utcnow()))
+            .order_by(PostIngestJob.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True))
+    with Session(engine) as session:
+        ids = [job_id for job_id in session.exec(stmt).all() if claim_job(session, job_id)]
+        session.commit()
+    return ids
+
+
+def unfinished_jobs() -> List[int]:
+    stmt = (select(PostIngestJob.id)
+            .where(_claimable(datetime.utcnow()))
+            .order_by(PostIngestJob.id))
+    with Session(engine) as session:
+        return list(session.exec(stmt).all())
+
+
+class PostIngestPipeline:
+    def __init__(self, mode: str = MODE, workers: int = WORKERS):
+        self.mode = mode
+        self.workers = workers
+        self.processed = 0
+        self.retried = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None   # memory mode: job ids
+        self._wake: Optional[asyncio.Event] = None    # db mode: new jobs were committed
+        self._tasks: List[asyncio.Task] = []
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def inline(self) -> bool:
+        return self.mode == "inline"
+
+    async def start(self):
+        if self.inline or self.workers <= 0 or self._tasks:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._wake = asyncio.Event()
+        # own threads, so jobs never take threadpool slots from sync endpoints
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="post-ingest")
+        if self.mode == "memory":
+            for job_id in await self._run(unfinished_jobs):
+                self._queue.put_nowait(job_id)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self._loop = None
+
+    def submit(self, job_ids: Iterable[int]):
+        """
+        Queues committed jobs. Safe to call from any thread. If the pipeline isn't running (e.g. a
+        script using the routers' helpers), the jobs stay pending in the table.
+        """
+        if self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._enqueue, list(job_ids))
+
+    def _enqueue(self, job_ids: List[int]):
+        if self.mode == "db":
+            # workers claim from the table; just wake the idle ones
+            self._wake.set()
+            return
+        for job_id in job_ids:
+            self._queue.put_nowait(job_id)
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "workers": len(self._tasks),
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "processed": self.processed,
+            "retried": self.retried,
+        }
+
+    async def _run(self, fn, *args):
+        return await self._loop.run_in_executor(self._executor, fn, *args)
+
+    async def _next_job(self) -> Optional[int]:
+        if self.mode == "memory":
+            return await self._queue.get()
+        self._wake.clear()
+        claimed = await self._run(claim_jobs, 1)
+        if claimed:
+            return claimed[0]
+        try:
+            await asyncio.wait_for(self._wake.wait(), POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        return None
+
+    async def _worker(self):
+        while True:
+            try:
+                job_id = await self._next_job()
+                if job_id is None:
+                    continue
+                retry = await self._run(execute, job_id, self.mode == "db")
+                if retry is None:
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # DB unavailable etc.: back off; pending jobs are picked up again later
+                await asyncio.sleep(POLL_INTERVAL)
+                continue
+            self.processed += 1
+            if retry:
+                self.retried += 1
+                if self.mode == "memory":
+                    self._queue.put_nowait(job_id)
+
+
+post_ingest = PostIngestPipeline()
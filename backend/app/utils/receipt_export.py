@@ -0,0 +1,151 @@
+# app/utils/receipt_export.py
+"""
+Bulk receipt export for one user and a date range, as a ZIP of PDFs or one multi-page PDF.
+
+Rows are read with a server-side cursor (yield_per) and output is yielded to the response as
+it is produced, so the API process holds at most a few chunks at a time:
+  * zip: chunks of receipts are rendered by ReportLab in a process pool (spawned workers: forking
+    a multithreaded server is unsafe) and written to the ZIP in order as they finish; receipts
+    already in receipt_cache are not rendered again.
+  * pdf: pages are written by PdfStreamWriter straight from receipt_layout (no ReportLab, cheap
+    enough for the response thread), CHUNK_SIZE pages per yielded block.
+
+RECEIPT_EXPORT_WORKERS  process pool size (default: CPU count)
+"""
+import multiprocessing
+import os
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, time, timedelta
+from types import SimpleNamespace
+from typing import Iterator, List, Optional, Tuple
+
+from reportlab.lib.pagesizes import A4
+from sqlmodel import Session, select
+
+from ..database import engine
+from ..models import Receipt, Transaction, User
+from .pdf_cache import receipt_cache
+from .pdf_stream import PdfStreamWriter
+from .receipt_generator import RECEIPT_FONTS, generate_receipt_pdf, receipt_cache_key, receipt_layout
+
+CHUNK_SIZE = 25         # receipts per pool task / PDF block
+FETCH_SIZE = 500        # rows per cursor fetch
+
+WORKERS = int(os.getenv("RECEIPT_EXPORT_WORKERS", "0")) or os.cpu_count() or 1
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _pool() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+
+def _iter_receipts(phone: str, start: date, end: date) -> Iterator[Tuple[int, SimpleNamespace, SimpleNamespace]]:
+    """
+    Yields (receipt_id, transaction, user) for receipts whose transaction falls in [start, end] (whole days).
+    transaction/user are plain namespaces with only the fields the receipt needs, so they pickle cheaply.
+    """
+    stmt = (select(Receipt.id, Transaction.timestamp, Transaction.amount, Transaction.currency,
+                   Transaction.source, Transaction.tx_type, User.name, User.phone)
+            .join(Transaction, Transaction.id == Receipt.transaction_id)
+            .join(User, User.id == Transaction.user_id)
+            .where(User.phone == phone,
+                   Transaction.timestamp >= datetime.combine(start, time.min),
+                   Transaction.timestamp < datetime.combine(end + timedelta(days=1), time.min))
+            .order_by(Transaction.timestamp, Receipt.id)
+            .execution_options(yield_per=FETCH_SIZE))
+    # own session: the response is streamed after the request's session is closed
+    with Session(engine) as session:
+        for receipt_id, ts, amount, currency, source, tx_type, name, user_phone in session.exec(stmt):
+            tx = SimpleNamespace(timestamp=ts, amount=amount, currency=currency, source=source, tx_type=tx_type)
+            user = SimpleNamespace(name=name, phone=user_phone)
+            yield receipt_id, tx, user
+
+
+def _render_chunk(items: List[Tuple[int, SimpleNamespace, SimpleNamespace]]) -> List[Tuple[int, bytes]]:
+    # runs in a pool worker
+    return [(receipt_id, generate_receipt_pdf(tx, user)) for receipt_id, tx, user in items]
+
+
+def _chunks(rows, size: int):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class _Sink:
+    """
+    Unseekable file object for zipfile: collects written bytes until drained into the response.
+    """
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data: bytes) -> int:
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def stream_receipts_zip(phone: str, start: date, end: date) -> Iterator[bytes]:
+    pool = _pool()
+    max_in_flight = WORKERS * 2
+    pending = deque()   # (cached {receipt_id: bytes}, keys, order, future or None), kept in row order
+    sink = _Sink()
+
+    def write_chunk(cached, keys, order, future, zf):
+        rendered = dict(future.result()) if future is not None else {}
+        for receipt_id in order:
+            data = cached.get(receipt_id)
+            if data is None:
+                data = rendered[receipt_id]
+                receipt_cache.put(keys[receipt_id], data)
+            zf.writestr(f"receipt_{receipt_id}.pdf", data)
+
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=1) as zf:
+        for chunk in _chunks(_iter_receipts(phone, start, end), CHUNK_SIZE):
+            cached, keys, misses = {}, {}, []
+            for receipt_id, tx, user in chunk:
+                keys[receipt_id] = receipt_cache_key(tx, user)
+                data = receipt_cache.get(keys[receipt_id])
+                if data is None:
+                    misses.append((receipt_id, tx, user))
+                else:
+                    cached[receipt_id] = data
+            future = pool.submit(_render_chunk, misses) if misses else None
+            pending.append((cached, keys, [row[0] for row in chunk], future))
+
+            # keep the pool busy but bound memory: write out the oldest chunk once enough are queued
+            while len(pending) >= max_in_flight or (pending and (pending[0][3] is None or pending[0][3].done())):
+                write_chunk(*pending.popleft(), zf)
+                yield sink.drain()
+
+        while pending:
+            write_chunk(*pending.popleft(), zf)
+            yield sink.drain()
+    yield sink.drain()
+
+
+def stream_receipts_pdf(phone: str, start: date, end: date) -> Iterator[bytes]:
+    writer = PdfStreamWriter(A4, RECEIPT_FONTS)
+    yield writer.start()
+    for chunk in _chunks(_iter_receipts(phone, start, end), CHUNK_SIZE):
+        yield b"".join(writer.add_page(receipt_layout(tx, user)) for _, tx, user in chunk)
+    yield writer.finish()
@@ -3,6 +3,25 @@ from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
 from io import BytesIO
 from datetime import datetime
+import hashlib
+from .metrics import timed
+
+# bump when the layout below changes, so cached PDFs (utils/pdf_cache.py) are not reused
+RECEIPT_TEMPLATE_VERSION = "1"
+
+def receipt_cache_key(transaction, user) -> str:
+    """
+    Content address of a receipt PDF: a hash of the template version and every value drawn on it.
+    The canvas is invariant, so the same key always means the same bytes (also used as the ETag).
+    """
+    parts = [
+        RECEIPT_TEMPLATE_VERSION,
+        user.name or "", user.phone,
+        transaction.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+        f"{transaction.amount:.2f}", transaction.currency or "",
+        transaction.source or "", transaction.tx_type or "",
+    ]
+    return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()
 
 def generate_receipt_pdf(transaction, user):
     """
@@ -10,27 +29,50 @@ def generate_receipt_pdf(transaction, user):
     user: ORM object (user)
     returns bytes
     """
-    buffer = BytesIO()
-    c = canvas.Canvas(buffer, pagesize=A4)
-    width, height = A4
+    with timed("pdf_render"):
+        buffer = BytesIO()
+        # invariant: no creation date / random document id, so identical input gives identical bytes
+        c = canvas.Canvas(buffer, pagesize=A4, invariant=1)
+        draw_receipt(c, transaction, user)
+        c.save()
+        return buffer.getvalue()
 
-    c.setFont("Helvetica-Bold", 16)
-    c.drawString(50, height - 80, "TajiriCircle - Digital Receipt")
+def receipt_layout(transaction, user):
+    """
+    What a receipt page shows, as drawing ops in PDF points:
+      ("text", font, size, x, y, string) and ("line", x1, y1, x2, y2).
+    Drawn with ReportLab by draw_receipt and written directly by the streamed multi-page export
+    (utils/pdf_stream.py), so both show the same receipt.
+    """
+    width, height = A4
+    return [
+        ("text", "Helvetica-Bold", 16, 50, height - 80, "TajiriCircle - Digital Receipt"),
+        ("text", "Helvetica", 12, 50, height - 120, f"User: {user.name or user.phone}"),
+        ("text", "Helvetica", 12, 50, height - 140, f"Phone: {user.phone}"),
+        ("text", "Helvetica", 12, 50, height - 160, f"Date: {transaction.timestamp.strftime('%Y-%m-%d %H:%M:%S')}"),
+        ("text", "Helvetica", 12, 50, height - 180, f"Amount: {transaction.amount:.2f} {transaction.currency}"),
+        ("text", "Helvetica", 12, 50, height - 200, f"Source: {transaction.source or 'N/A'}"),
+        ("text", "Helvetica", 12, 50, height - 220, f"Type: {transaction.tx_type or 'N/A'}"),
+        ("text", "Helvetica", 12, 50, height - 240, "Reference: autogenerated"),
+        ("line", 50, height - 250, width - 50, height - 250),
+        ("text", "Helvetica-Oblique", 9, 50, height - 270, "This is an auto-generated receipt from TajiriCircle."),
+    ]
 
-    c.setFont("Helvetica", 12)
-    c.drawString(50, height - 120, f"User: {user.name or user.phone}")
-    c.drawString(50, height - 140, f"Phone: {user.phone}")
-    c.drawString(50, height - 160, f"Date: {transaction.timestamp.strftime('%Y-%m-%d %H:%M:%S')}")
-    c.drawString(50, height - 180, f"Amount: {transaction.amount:.2f} {transaction.currency}")
-    c.drawString(50, height - 200, f"Source: {transaction.source or 'N/A'}")
-    c.drawString(50, height - 220, f"Type: {transaction.tx_type or 'N/A'}")
-    c.drawString(50, height - 240, "Reference: autogenerated")
+RECEIPT_FONTS = ("Helvetica", "Helvetica-Bold", "Helvetica-Oblique")
 
-    c.line(50, height - 250, width - 50, height - 250)
-    c.setFont("Helvetica-Oblique", 9)
-    c.drawString(50, height - 270, "This is an auto-generated receipt from TajiriCircle.")
+def draw_receipt(c, transaction, user):
+    """
+    Draws one receipt page on canvas c.
+    """
+    font = None
+    for op in receipt_layout(transaction, user):
+        if op[0] == "line":
+            c.line(*op[1:])
+            continue
+        _, name, size, x, y, text = op
+        if (name, size) != font:
+            c.setFont(name, size)
+            font = (name, size)
+        c.drawString(x, y, text)
 
     c.showPage()
-    c.save()
-    buffer.seek(0)
-    return buffer.read()
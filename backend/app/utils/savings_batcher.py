@@ -0,0 +1,92 @@
+# app/utils/savings_batcher.py
+"""
+Optional micro-batching for savings contributions to hot goals (group savings circles).
+
+The first contribution to a goal becomes the leader: it waits SAVINGS_MICROBATCH_WINDOW_MS for
+others to the same goal to queue up, then writes all of them in one transaction (one atomic
+UPDATE on the goal + the ledger rows, see crud.add_savings_contributions). Every caller gets
+the goal total as it stood right after its own contribution. Requests to different goals
+never wait on each other.
+
+SAVINGS_MICROBATCH            enable (default false: each request does its own UPDATE)
+SAVINGS_MICROBATCH_WINDOW_MS  how long a leader collects contributions (default 2)
+"""
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlmodel import Session
+
+from .. import crud
+from ..database import engine
+
+
+class _Contribution:
+    __slots__ = ("user_id", "amount", "done", "result", "error")
+
+    def __init__(self, user_id: int, amount: float):
+        self.user_id = user_id
+        self.amount = amount
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SavingsMicroBatcher:
+    def __init__(self, window: float):
+        self.window = window
+        self._lock = threading.Lock()
+        self._pending: Dict[int, List[_Contribution]] = {}
+        self.batches = 0
+        self.contributions = 0
+
+    def contribute(self, goal_id: int, user_id: int, amount: float) -> Optional[Tuple[int, float, float]]:
+        """
+        Blocking; call from a worker thread. goal_id must already exist and be committed.
+        Returns (goal_id, current_amount, target_amount) like crud.contribute_savings.
+        """
+        item = _Contribution(user_id, amount)
+        with self._lock:
+            queue = self._pending.get(goal_id)
+            leader = queue is None
+            if leader:
+                queue = self._pending[goal_id] = []
+            queue.append(item)
+
+        if leader:
+            time.sleep(self.window)
+            with self._lock:
+                batch = self._pending.pop(goal_id)
+            self._write(goal_id, batch)
+
+        item.done.wait()
+        if item.error is not None:
+            raise item.error
+        return item.result
+
+    def _write(self, goal_id: int, batch: List[_Contribution]):
+        try:
+            with Session(engine, expire_on_commit=False) as session:
+                goal = crud.add_savings_contributions(session, goal_id, [(c.user_id, c.amount) for c in batch])
+                session.commit()
+            if goal is not None:
+                # hand back running totals in arrival order
+                _, total, target = goal
+                for c in reversed(batch):
+                    c.result = (goal_id, total, target)
+                    total -= c.amount
+            with self._lock:
+                self.batches += 1
+                self.contributions += len(batch)
+        except Exception as exc:
+            for c in batch:
+                c.error = exc
+        finally:
+            for c in batch:
+                c.done.set()
+
+
+savings_batcher: Optional[SavingsMicroBatcher] = None
+if os.getenv("SAVINGS_MICROBATCH", "false").strip().lower() in ("1", "true", "yes", "on"):
+    savings_batcher = SavingsMicroBatcher(float(os.getenv("SAVINGS_MICROBATCH_WINDOW_MS", "2")) / 1000)
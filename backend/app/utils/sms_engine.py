@@ -0,0 +1,132 @@
+# app/utils/sms_engine.py
+"""
+Single-pass SMS classification shared by sms_parser and fraud_detector.
+
+All keywords (receive/send words + phishing keywords), the amount pattern and the URL pattern
+are compiled into one regex (keywords as a prefix trie, inside a lookahead) that is scanned once
+over the lowercased text; the digit count of an ASCII message is a single bytes.translate.
+parse_mpesa_sms and score_sms_for_fraud are thin views over the SMSFeatures this returns, so a
+caller that needs both classifies once.
+"""
+import re
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional
+
+RECEIVE_WORDS = ["received", "you have received", "paid you", "you received"]
+SEND_WORDS = ["sent", "you have sent", "you paid"]
+PHISHING_KEYWORDS = [
+    "loan", "loan offer", "click", "link", "verify", "login", "update", "account suspended",
+    "confirm", "pay now", "pay immediately", "urgent"
+]
+
+# patterns are written for lowercased text
+AMOUNT_PATTERN = r"k(?:sh|es)\s*([0-9,]+(?:\.[0-9]{1,2})?)"
+URL_PATTERN = r"(?:https?://|bit\.ly/|tinyurl\.com/)\S+"
+
+_RECEIVE = frozenset(RECEIVE_WORDS)
+_SEND = frozenset(SEND_WORDS)
+_PHISHING = frozenset(PHISHING_KEYWORDS)
+_KEYWORDS = _RECEIVE | _SEND | _PHISHING
+
+_AMOUNT_PREFIXES = ("ksh", "kes")
+_AMOUNT_TAIL = r"\s*[0-9,]+(?:\.[0-9]{1,2})?"
+_URL_PREFIXES = ("http://", "https://", "bit.ly/", "tinyurl.com/")
+_URL_TAIL = r"\S+"
+
+
+def _trie_pattern(literals: Dict[str, str]) -> str:
+    """
+    literals: literal prefix -> regex tail that must follow it ("" for plain keywords).
+    Builds one alternation shaped like a prefix trie, e.g. "loan", "loan offer", "login" ->
+    l(?:o(?:an(?:\ offer)?|gin)), so the regex engine does one character test per step and
+    can skip quickly to the positions where some branch can start. Takes the longest keyword.
+    """
+    trie: Dict[str, dict] = {}
+    for literal, tail in literals.items():
+        node = trie
+        for ch in literal:
+            node = node.setdefault(ch, {})
+        node[""] = tail
+
+    def build(node: dict) -> str:
+        alts = [re.escape(ch) + build(sub) for ch, sub in sorted(node.items()) if ch]
+        if not alts:
+            return node[""]
+        body = alts[0] if len(alts) == 1 else "(?:%s)" % "|".join(alts)
+        return "(?:%s)?" % body if "" in node else body
+
+    return build(trie)
+
+
+_LITERALS = dict.fromkeys(_KEYWORDS, "")
+_LITERALS.update(dict.fromkeys(_AMOUNT_PREFIXES, _AMOUNT_TAIL))
+_LITERALS.update(dict.fromkeys(_URL_PREFIXES, _URL_TAIL))
+
+# The pattern sits in a lookahead, so findall tries every position without consuming text and
+# gives the longest hit starting at each one, in text order: overlapping keywords are all seen
+# ("you paid you" -> "you paid" and "paid you"), as are keywords and amounts inside a URL
+# ("http://mpesa-verify.co/login"). Each keyword also records the shorter keywords inside it
+# (_IMPLIED: "you have received" -> "received"). Together that is exactly the old "kw in text"
+# checks (tests/test_sms_engine.py compares against the old implementation).
+_SCAN_RE = re.compile("(?=(%s))" % _trie_pattern(_LITERALS))
+_IMPLIED = {k: frozenset(s for s in _KEYWORDS if s in k) for k in _KEYWORDS}
+_DIGITS = b"0123456789"
+
+
+class SMSFeatures(NamedTuple):
+    amount: Optional[float]
+    tx_type: str                  # RECEIVE / SEND / UNKNOWN
+    has_url: bool
+    keywords: FrozenSet[str]      # phishing keywords found
+    digit_count: int
+
+
+def classify(text: str) -> SMSFeatures:
+    t = text.lower()
+    hits = set()
+    amounts = []
+    has_url = _scan(t, hits, amounts)
+
+    amount = None
+    if amounts:
+        try:
+            amount = float(amounts[0].replace(",", ""))
+        except ValueError:
+            amount = None
+
+    if hits & _RECEIVE:
+        tx_type = "RECEIVE"
+    elif hits & _SEND:
+        tx_type = "SEND"
+    else:
+        tx_type = "UNKNOWN"
+
+    return SMSFeatures(amount, tx_type, has_url, frozenset(hits & _PHISHING), _digit_count(t))
+
+
+def _digit_count(t: str) -> int:
+    # str.isdigit, like the old check, so other scripts' digits ("١٢٣") count too; for ASCII
+    # text, which is nearly every SMS, bytes.translate deletes the digits in one C loop
+    if t.isascii():
+        return len(t) - len(t.encode().translate(None, _DIGITS))
+    return sum(map(str.isdigit, t))
+
+
+def _scan(t: str, hits: set, amounts: list) -> bool:
+    has_url = False
+    for hit in _SCAN_RE.findall(t):
+        implied = _IMPLIED.get(hit)
+        if implied is not None:
+            hits |= implied
+        elif hit[0] == "k":
+            amounts.append(hit[3:].lstrip())
+        else:
+            has_url = True
+    return has_url
+
+
+def classify_many(texts: Iterable[str]) -> List[SMSFeatures]:
+    """
+    classify() for each of texts, for the batch ingest path. Not a batch scan: the regex scan is
+    nearly all of the cost, and one scan over the joined batch measured slower than one per message.
+    """
+    return [classify(t) for t in texts]
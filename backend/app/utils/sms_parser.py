@@ -1,42 +1,78 @@
 # app/utils/sms_parser.py
 import re
+from datetime import datetime
 from typing import Optional, Dict
+from .sms_engine import AMOUNT_PATTERN, URL_PATTERN, SMSFeatures, classify
 
-# A few regexes to catch typical M-Pesa styles; expand as needed
-AMOUNT_RE = re.compile(r"(?:Ksh|KES|KSh|KSH|KES)\s*([0-9,]+(?:\.[0-9]{1,2})?)", re.IGNORECASE)
-RECEIVE_WORDS = ["received", "you have received", "paid you", "you received"]
-SEND_WORDS = ["sent", "you have sent", "you paid"]
+# A few regexes to catch typical M-Pesa styles; expand as needed (the scan itself lives in sms_engine)
+AMOUNT_RE = re.compile(AMOUNT_PATTERN, re.IGNORECASE)
+URL_RE = re.compile(URL_PATTERN, re.IGNORECASE)
 
-URL_RE = re.compile(r"https?://\S+|bit\.ly/\S+|tinyurl\.com/\S+", re.IGNORECASE)
+# "QGH7ABC123 Confirmed. You have received Ksh1,500.00 from JOHN DOE 0722000111 on 12/3/24 at 2:15 PM.
+#  New M-PESA balance is Ksh3,000.00."
+MPESA_CODE_RE = re.compile(r"^\s*([A-Z0-9]{10})\s+confirmed", re.IGNORECASE)
+COUNTERPARTY_RE = re.compile(
+    r"\b(?:from|to)\s+(.+?)\s*((?:\+?254|0)\d{9})?\s*(?:for account\s+\S+\s*)?\.?\s+on\s+\d", re.IGNORECASE)
+BALANCE_RE = re.compile(r"balance\s+is\s*k(?:sh|es)\s*([0-9,]+(?:\.[0-9]{1,2})?)", re.IGNORECASE)
+EVENT_TIME_RE = re.compile(r"\bon\s+(\d{1,2}/\d{1,2}/\d{2,4})\s+at\s+(\d{1,2}:\d{2}\s*[AP]M)", re.IGNORECASE)
 
-def parse_mpesa_sms(text: str) -> Dict[str, Optional[str]]:
+def parse_mpesa_sms(text: str, features: Optional[SMSFeatures] = None) -> Dict[str, Optional[str]]:
     """
-    Returns dict: amount (float), tx_type (RECEIVE/SEND/UNKNOWN), source (M-PESA)
+    Returns dict: amount (float), tx_type (RECEIVE/SEND/UNKNOWN), source (M-PESA), has_url
+    + the M-Pesa details from parse_details (None when not found).
+    Pass features if the SMS was already classified.
     """
-    text_lower = text.lower()
-    amount = None
-    m = AMOUNT_RE.search(text)
-    if m:
-        raw = m.group(1).replace(",", "")
-        try:
-            amount = float(raw)
-        except:
-            amount = None
-
-    tx_type = None
-    if any(w in text_lower for w in RECEIVE_WORDS):
-        tx_type = "RECEIVE"
-    elif any(w in text_lower for w in SEND_WORDS):
-        tx_type = "SEND"
-    else:
-        tx_type = "UNKNOWN"
-
-    has_url = bool(URL_RE.search(text))
+    if features is None:
+        features = classify(text)
+    parsed = parse_features(features)
+    parsed.update(parse_details(text))
+    return parsed
 
+def parse_features(features: SMSFeatures) -> Dict[str, Optional[str]]:
+    """
+    Same dict as parse_mpesa_sms, from an already classified SMS.
+    """
     parsed = {
-        "amount": amount,
-        "tx_type": tx_type,
+        "amount": features.amount,
+        "tx_type": features.tx_type,
         "source": "M-PESA",
-        "has_url": has_url,
+        "has_url": features.has_url,
     }
     return parsed
+
+def parse_details(text: str) -> Dict[str, Optional[str]]:
+    """
+    Returns dict: mpesa_code, counterparty_name, counterparty_phone, balance (float), event_time (datetime)
+    """
+    details = {
+        "mpesa_code": None,
+        "counterparty_name": None,
+        "counterparty_phone": None,
+        "balance": None,
+        "event_time": None,
+    }
+    m = MPESA_CODE_RE.search(text)
+    if m:
+        details["mpesa_code"] = m.group(1).upper()
+
+    m = COUNTERPARTY_RE.search(text)
+    if m:
+        details["counterparty_name"] = m.group(1).strip().rstrip(".") or None
+        details["counterparty_phone"] = m.group(2)
+
+    m = BALANCE_RE.search(text)
+    if m:
+        try:
+            details["balance"] = float(m.group(1).replace(",", ""))
+        except ValueError:
+            pass
+
+    m = EVENT_TIME_RE.search(text)
+    if m:
+        date, time = m.group(1), m.group(2).upper().replace(" ", "")
+        fmt = "%d/%m/%Y %I:%M%p" if len(date.rsplit("/", 1)[-1]) == 4 else "%d/%m/%y %I:%M%p"
+        try:
+            details["event_time"] = datetime.strptime(f"{date} {time}", fmt)
+        except ValueError:
+            pass
+    return details
@@ -0,0 +1,132 @@
+# app/utils/user_cache.py
+"""
+Read-through cache of users, so resolving a phone number (every ingest, history, summary and
+savings request) or a receipt's user usually costs no DB round trip:
+  phone   -> CachedUser (id, phone, name)
+  user id -> CachedUser
+Both are bounded LRUs with a TTL. crud.get_user_by_phone / get_user / get_or_create_user(s)
+read through them.
+
+Users read from the DB are cached right away. A user inserted by the current DB transaction is
+cached when it commits (after a rollback its id would not exist). Updating or deleting a User
+through the ORM drops its entries at flush and again at commit, so a concurrent reader can't
+put the old values back in between. Bulk UPDATE statements on user bypass the ORM events: call
+user_cache.invalidate() after them. Other processes only see a change after the TTL.
+
+USER_CACHE_SIZE   users kept in memory (default 100000)
+USER_CACHE_TTL    seconds an entry is trusted (default 300)
+"""
+import os
+import time
+from typing import Dict, Iterable, NamedTuple, Optional, Set
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session as _Session, object_session
+from sqlmodel import Session
+
+from ..models import User
+from .lru import LRUCache
+
+CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "100000"))
+CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "300"))
+
+_NEW = "user_cache_new"          # user id -> CachedUser inserted in this DB transaction
+_CHANGED = "user_cache_changed"  # user id -> phones of users updated / deleted in it
+
+
+class CachedUser(NamedTuple):
+    """
+    Detached snapshot of a User: safe to share across sessions and threads.
+    """
+    id: int
+    phone: str
+    name: Optional[str]
+
+
+class UserCache:
+    def __init__(self, max_size: int = CACHE_SIZE, ttl: float = CACHE_TTL):
+        self.ttl = ttl
+        self.phones = LRUCache(max_size)  # phone -> (CachedUser, expires)
+        self.ids = LRUCache(max_size)     # user id -> (CachedUser, expires)
+
+    @staticmethod
+    def _fresh(entry) -> Optional[CachedUser]:
+        if entry is not None and entry[1] > time.monotonic():
+            return entry[0]
+        return None
+
+    def by_phone(self, phone: str) -> Optional[CachedUser]:
+        return self._fresh(self.phones.get(phone))
+
+    def by_id(self, user_id: int) -> Optional[CachedUser]:
+        return self._fresh(self.ids.get(user_id))
+
+    def _store(self, user: CachedUser):
+        entry = (user, time.monotonic() + self.ttl)
+        self.phones.put(user.phone, entry)
+        self.ids.put(user.id, entry)
+
+    def put(self, session: Session, row) -> CachedUser:
+        """
+        Caches a user read from the DB (row: anything with id, phone, name) and returns its snapshot.
+        A user inserted or changed by the session's open transaction is left to the commit.
+        """
+        user = CachedUser(row.id, row.phone, row.name)
+        if user.id not in session.info.get(_NEW, ()) and user.id not in session.info.get(_CHANGED, ()):
+            self._store(user)
+        return user
+
+    def put_on_commit(self, session: Session, row) -> CachedUser:
+        """
+        Like put, for a user the session just inserted: cached once its transaction commits.
+        """
+        user = CachedUser(row.id, row.phone, row.name)
+        session.info.setdefault(_NEW, {})[user.id] = user
+        return user
+
+    def invalidate(self, user_id: Optional[int] = None, phones: Iterable[str] = ()):
+        if user_id is not None:
+            self.ids.pop(user_id)
+        for phone in phones:
+            self.phones.pop(phone)
+
+    def clear(self):
+        self.phones.clear()
+        self.ids.clear()
+
+    def stats(self) -> dict:
+        return {"users": len(self.ids), "hits": self.phones.hits + self.ids.hits,
+                "misses": self.phones.misses + self.ids.misses}
+
+
+user_cache = UserCache()
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _user_changed(mapper, connection, target):
+    # the old phone too, if this update changed it
+    phones = {target.phone, *inspect(target).attrs.phone.history.deleted}
+    user_cache.invalidate(target.id, phones)
+    session = object_session(target)
+    if session is not None:
+        changed: Dict[int, Set[str]] = session.info.setdefault(_CHANGED, {})
+        changed.setdefault(target.id, set()).update(phones)
+
+
+@event.listens_for(_Session, "after_commit")
+def _apply_committed(session):
+    changed = session.info.pop(_CHANGED, None) or {}
+    for user_id, phones in changed.items():
+        user_cache.invalidate(user_id, phones)
+    for user_id, user in (session.info.pop(_NEW, None) or {}).items():
+        if user_id not in changed:
+            user_cache._store(user)
+
+
+@event.listens_for(_Session, "after_transaction_end")
+def _drop_uncommitted(session, transaction):
+    # not committed (rollback or close): nothing of it may reach the cache
+    if transaction.parent is None:
+        session.info.pop(_NEW, None)
+        session.info.pop(_CHANGED, None)
@@ -0,0 +1,96 @@
+# benchmarks/bench_micro.py
+"""
+Microbenchmarks of the hot-path functions, with an optional regression check:
+  parse_mpesa_sms        per message, over the synthetic corpus
+  score_sms_for_fraud    per message, over the synthetic corpus
+  generate_receipt_pdf   per receipt
+
+Each is timed BENCH_REPEAT times and the best run is reported (least disturbed by other load).
+--save writes the results to a baseline file; --check compares against it and exits with
+status 1 if any function got slower than the tolerance, so it can gate a deploy.
+
+Run from backend/:
+    python -m benchmarks.bench_micro
+    python -m benchmarks.bench_micro --save            # on the reference machine / commit
+    python -m benchmarks.bench_micro --check --tolerance 0.25
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+from app.utils.fraud_detector import score_sms_for_fraud
+from app.utils.receipt_generator import generate_receipt_pdf
+from app.utils.sms_parser import parse_mpesa_sms
+from benchmarks.corpus import make_corpus
+
+N = int(os.getenv("BENCH_SMS", "20000"))
+PDFS = int(os.getenv("BENCH_PDFS", "200"))
+REPEAT = int(os.getenv("BENCH_REPEAT", "5"))
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline_micro.json")
+
+
+def best_of(fn, n: int) -> float:
+    # microseconds per call, best of REPEAT runs
+    runs = []
+    for _ in range(REPEAT):
+        t0 = time.perf_counter()
+        fn()
+        runs.append((time.perf_counter() - t0) / n * 1e6)
+    return min(runs)
+
+
+def measure() -> dict:
+    texts = make_corpus(N)
+    user = SimpleNamespace(name="JOHN DOE", phone="0722000111")
+    txs = [SimpleNamespace(timestamp=datetime(2024, 3, 12, 14, 15), amount=100.0 + i, currency="KES",
+                           source="M-PESA", tx_type="RECEIVE") for i in range(PDFS)]
+    return {
+        "parse_mpesa_sms": best_of(lambda: [parse_mpesa_sms(t) for t in texts], N),
+        "score_sms_for_fraud": best_of(lambda: [score_sms_for_fraud(t) for t in texts], N),
+        "generate_receipt_pdf": best_of(lambda: [generate_receipt_pdf(tx, user) for tx in txs], PDFS),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--save", action="store_true", help="write results to the baseline file")
+    parser.add_argument("--check", action="store_true", help="fail if slower than the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown (0.25 = 25%%)")
+    parser.add_argument("--baseline", default=BASELINE)
+    args = parser.parse_args()
+
+    results = measure()
+    baseline = {}
+    if args.check or os.path.exists(args.baseline):
+        try:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        except OSError:
+            if args.check:
+                sys.exit(f"no baseline at {args.baseline}; run with --save first")
+
+    regressions = []
+    for name, us in results.items():
+        line = f"{name:<22} {us:10.1f} us/call"
+        if name in baseline:
+            change = us / baseline[name] - 1
+            line += f"   baseline {baseline[name]:10.1f} us ({change:+.0%})"
+            if change > args.tolerance:
+                regressions.append(name)
+                line += "   REGRESSION"
+        print(line)
+
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"saved {args.baseline}")
+    if args.check and regressions:
+        sys.exit(f"slower than baseline by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
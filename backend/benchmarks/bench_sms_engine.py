@@ -0,0 +1,87 @@
+# benchmarks/bench_sms_engine.py
+"""
+parse_mpesa_sms + score_sms_for_fraud: the old multi-pass implementations vs the single-pass
+sms_engine (classify once per message).
+Also checks that both give identical results on the corpus.
+
+Run from backend/:
+    python -m benchmarks.bench_sms_engine
+"""
+import os
+import re
+import time
+
+from app.utils.fraud_detector import score_features
+from app.utils.sms_engine import classify
+from app.utils.sms_parser import parse_features
+from benchmarks.corpus import make_corpus
+
+N = int(os.getenv("BENCH_SMS", "20000"))
+
+# --- the implementations sms_engine replaced, kept here as the baseline ---
+AMOUNT_RE = re.compile(r"(?:Ksh|KES|KSh|KSH|KES)\s*([0-9,]+(?:\.[0-9]{1,2})?)", re.IGNORECASE)
+RECEIVE_WORDS = ["received", "you have received", "paid you", "you received"]
+SEND_WORDS = ["sent", "you have sent", "you paid"]
+URL_RE = re.compile(r"https?://\S+|bit\.ly/\S+|tinyurl\.com/\S+", re.IGNORECASE)
+PHISHING_KEYWORDS = [
+    "loan", "loan offer", "click", "link", "verify", "login", "update", "account suspended",
+    "confirm", "pay now", "pay immediately", "urgent"
+]
+
+
+def old_parse(text):
+    text_lower = text.lower()
+    amount = None
+    m = AMOUNT_RE.search(text)
+    if m:
+        try:
+            amount = float(m.group(1).replace(",", ""))
+        except ValueError:
+            amount = None
+    if any(w in text_lower for w in RECEIVE_WORDS):
+        tx_type = "RECEIVE"
+    elif any(w in text_lower for w in SEND_WORDS):
+        tx_type = "SEND"
+    else:
+        tx_type = "UNKNOWN"
+    return {"amount": amount, "tx_type": tx_type, "source": "M-PESA", "has_url": bool(URL_RE.search(text))}
+
+
+def old_score(text):
+    score = 0.0
+    t = text.lower()
+    if URL_RE.search(t):
+        score += 0.5
+    for kw in PHISHING_KEYWORDS:
+        if kw in t:
+            score += 0.2
+    if sum(c.isdigit() for c in t) > 15:
+        score += 0.2
+    return min(score, 1.0)
+
+
+def timed(label, fn, baseline=None):
+    t0 = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - t0
+    line = f"{label:<28} {elapsed * 1e6 / N:7.2f} us/msg"
+    if baseline:
+        line += f"   x{baseline / elapsed:.2f}"
+    print(line)
+    return elapsed
+
+
+def main():
+    corpus = make_corpus(N)
+    for text in corpus:
+        f = classify(text)
+        assert parse_features(f) == old_parse(text), text
+        assert score_features(f) == old_score(text), text
+    print(f"{N} messages, results identical")
+
+    base = timed("old parse + score", lambda: [(old_parse(t), old_score(t)) for t in corpus])
+    timed("classify + parse + score", lambda: [(parse_features(f), score_features(f)) for f in map(classify, corpus)], base)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# tests/conftest.py
+"""
+The app reads its settings at import time, so they are set here, before any test imports it:
+a throwaway SQLite file instead of the Postgres database of .env, receipt PDFs cached in memory
+only, and post-ingest work done before /parse responds.
+
+Run from backend/:
+    python -m pytest -q tests
+"""
+import os
+import tempfile
+
+_DB_DIR = tempfile.mkdtemp(prefix="tajiri_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_DB_DIR, 'test.db')}"
+os.environ["RECEIPT_CACHE_DIR"] = ""
+os.environ["RECEIPT_EXPORT_WORKERS"] = "2"
+os.environ["POST_INGEST_MODE"] = "inline"
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, SQLModel
+
+
+@pytest.fixture
+def engine():
+    """
+    Empty tables and in-process caches for every test.
+    """
+    from app.database import engine
+    from app.utils.behavior import behavior_profiles
+    from app.utils.idempotency import idempotency_store
+    from app.utils.pdf_cache import receipt_cache
+    from app.utils.user_cache import user_cache
+
+    SQLModel.metadata.drop_all(engine)
+    SQLModel.metadata.create_all(engine)
+    receipt_cache.memory.clear()
+    idempotency_store.cache.clear()
+    behavior_profiles.cache.clear()
+    user_cache.clear()
+    return engine
+
+
+@pytest.fixture
+def session(engine):
+    with Session(engine, expire_on_commit=False) as session:
+        yield session
+
+
+@pytest.fixture
+def client(engine):
+    from app.main import app
+
+    with TestClient(app) as client:
+        yield client
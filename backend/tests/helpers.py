@@ -0,0 +1,13 @@
+# tests/helpers.py
+
+
+def sms(code="QWE1234567", amount="1,000.00", name="JOHN DOE", phone="0712345678",
+        when="5/6/24 at 2:15 PM", balance="5,000.00", kind="sent"):
+    """
+    An M-Pesa confirmation SMS; kind is "sent" or "received".
+    """
+    if kind == "received":
+        return (f"{code} Confirmed. You have received Ksh{amount} from {name} {phone} on {when}. "
+                f"New M-PESA balance is Ksh{balance}.")
+    return (f"{code} Confirmed. Ksh{amount} sent to {name} {phone} on {when}. "
+            f"New M-PESA balance is Ksh{balance}. Transaction cost, Ksh13.00.")
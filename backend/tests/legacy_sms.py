@@ -0,0 +1,46 @@
+# tests/legacy_sms.py
+"""
+The multi-pass parse_mpesa_sms / score_sms_for_fraud that sms_engine replaced, kept as the
+oracle for tests/test_sms_engine.py.
+"""
+import re
+
+AMOUNT_RE = re.compile(r"(?:Ksh|KES|KSh|KSH|KES)\s*([0-9,]+(?:\.[0-9]{1,2})?)", re.IGNORECASE)
+RECEIVE_WORDS = ["received", "you have received", "paid you", "you received"]
+SEND_WORDS = ["sent", "you have sent", "you paid"]
+URL_RE = re.compile(r"https?://\S+|bit\.ly/\S+|tinyurl\.com/\S+", re.IGNORECASE)
+PHISHING_KEYWORDS = [
+    "loan", "loan offer", "click", "link", "verify", "login", "update", "account suspended",
+    "confirm", "pay now", "pay immediately", "urgent"
+]
+
+
+def old_parse(text):
+    text_lower = text.lower()
+    amount = None
+    m = AMOUNT_RE.search(text)
+    if m:
+        try:
+            amount = float(m.group(1).replace(",", ""))
+        except ValueError:
+            amount = None
+    if any(w in text_lower for w in RECEIVE_WORDS):
+        tx_type = "RECEIVE"
+    elif any(w in text_lower for w in SEND_WORDS):
+        tx_type = "SEND"
+    else:
+        tx_type = "UNKNOWN"
+    return {"amount": amount, "tx_type": tx_type, "source": "M-PESA", "has_url": bool(URL_RE.search(text))}
+
+
+def old_score(text):
+    score = 0.0
+    t = text.lower()
+    if URL_RE.search(t):
+        score += 0.5
+    for kw in PHISHING_KEYWORDS:
+        if kw in t:
+            score += 0.2
+    if sum(c.isdigit() for c in t) > 15:
+        score += 0.2
+    return min(score, 1.0)
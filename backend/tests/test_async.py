@@ -0,0 +1,77 @@
+# tests/test_async.py
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import async_crud, database
+from app.models import Transaction
+from app.routers import async_savings_router, async_sms_router, async_transactions_router
+from tests.helpers import sms
+
+
+@pytest.fixture
+def async_engine(engine):
+    async_engine = create_async_engine(database._async_url(str(engine.url)), poolclass=NullPool)
+    yield async_engine
+    asyncio.run(async_engine.dispose())
+
+
+@pytest.fixture
+def async_client(async_engine):
+    """
+    The async routers, as main.py mounts them with DB_ASYNC=true, on an aiosqlite engine.
+    """
+    app = FastAPI()
+    for module in (async_sms_router, async_transactions_router, async_savings_router):
+        app.include_router(module.router)
+
+    async def get_async_session():
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            yield session
+
+    app.dependency_overrides[database.get_async_session] = get_async_session
+    with TestClient(app) as client:
+        yield client
+
+
+def test_async_url():
+    assert database._async_url("postgresql://u:p@db:5432/x") == "postgresql+asyncpg://u:p@db:5432/x"
+    assert database._async_url("postgres://u:p@db/x") == "postgresql+asyncpg://u:p@db/x"
+    assert database._async_url("postgresql+psycopg2://u@db/x") == "postgresql+asyncpg://u@db/x"
+    assert database._async_url("sqlite:///./dev.db") == "sqlite+aiosqlite:///./dev.db"
+
+
+def test_async_crud(async_engine, session):
+    async def run():
+        async with AsyncSession(async_engine, expire_on_commit=False) as s:
+            user = await async_crud.get_or_create_user(s, "0700000001")
+            tx = await async_crud.create_transaction(s, user_id=user.id, amount=10.0, tx_type="SEND")
+            await s.commit()
+            return tx.id
+
+    tx_id = asyncio.run(run())
+    assert session.get(Transaction, tx_id).amount == 10.0
+
+
+def test_async_routes(async_client, session):
+    r = async_client.post("/api/sms/parse", json={"phone": "0700000001", "text": sms()})
+    assert r.status_code == 200
+    items = [{"phone": "0700000001", "text": sms(code="BBB0000002", amount="20.00")},
+             {"phone": "0700000001", "text": "hello"}]
+    body = async_client.post("/api/sms/parse/batch", json={"items": items}).json()
+    assert [res["index"] for res in body["results"]] == [0]
+    assert [e["index"] for e in body["errors"]] == [1]
+    assert len(session.exec(select(Transaction)).all()) == 2
+
+    r = async_client.get("/api/transactions/by-phone/0700000001")
+    assert r.status_code == 200
+    assert len(r.json()) == 2
+    r = async_client.post("/api/savings/contribute", json={"user_phone": "0700000001", "amount": 50})
+    assert r.status_code == 200
+    assert r.json()["current_amount"] == 50.0
@@ -0,0 +1,60 @@
+# tests/test_batch_ingest.py
+from sqlmodel import select
+
+from app.models import FraudAlert, Receipt, Transaction, User
+from tests.helpers import sms
+
+
+def test_batch_results_and_errors_by_index(client, session):
+    items = [
+        {"phone": "0700000001", "text": sms(code="AAA0000001", amount="20.00")},
+        {"phone": "0700000002", "text": "not an M-Pesa message"},
+        {"phone": "0700000002", "text": sms(code="BBB0000002", amount="30.00", kind="received")},
+    ]
+    r = client.post("/api/sms/parse/batch", json={"items": items})
+    assert r.status_code == 200
+    body = r.json()
+    assert body["errors"] == [{"index": 1, "detail": "Could not parse amount from SMS."}]
+    got = [(res["index"], res["transaction"]["amount"], res["transaction"]["tx_type"]) for res in body["results"]]
+    assert got == [(0, 20.0, "SEND"), (2, 30.0, "RECEIVE")]
+    for res, item in zip(body["results"], (items[0], items[2])):
+        alert = session.get(FraudAlert, res["fraud"]["alert_id"])
+        assert alert.sms_text == item["text"]
+        assert session.get(Receipt, res["receipt_id"]).transaction_id == res["transaction"]["id"]
+    assert len(session.exec(select(User)).all()) == 2
+    assert len(session.exec(select(Transaction)).all()) == 2
+
+
+def test_batch_reuses_existing_users(client, session):
+    client.post("/api/sms/parse", json={"phone": "0700000001", "text": sms(code="AAA0000001")})
+    items = [{"phone": "0700000001", "text": sms(code=f"CCC000000{i}", amount=f"{i}0.00")} for i in range(1, 4)]
+    body = client.post("/api/sms/parse/batch", json={"items": items}).json()
+    assert [res["index"] for res in body["results"]] == [0, 1, 2]
+    assert len(session.exec(select(User)).all()) == 1
+    assert len(session.exec(select(Transaction)).all()) == 4
+
+
+def test_batch_limits(client):
+    assert client.post("/api/sms/parse/batch", json={"items": []}).status_code == 422
+    items = [{"phone": "0700000001", "text": sms()}] * 1001
+    assert client.post("/api/sms/parse/batch", json={"items": items}).status_code == 422
+
+
+def test_batch_skips_duplicate_codes(client, session):
+    client.post("/api/sms/parse", json={"phone": "0700000001", "text": sms(code="AAA0000001", amount="10.00")})
+    items = [
+        {"phone": "0700000001", "text": sms(code="BBB0000002", amount="20.00")},
+        # already stored: skipped in the middle of the batch
+        {"phone": "0700000001", "text": sms(code="AAA0000001", amount="11.00")},
+        {"phone": "0700000002", "text": sms(code="CCC0000003", amount="30.00")},
+        # repeated within the batch
+        {"phone": "0700000002", "text": sms(code="CCC0000003", amount="31.00")},
+    ]
+    body = client.post("/api/sms/parse/batch", json={"items": items}).json()
+    assert [e["index"] for e in body["errors"]] == [1, 3]
+    got = [(res["index"], res["transaction"]["mpesa_code"], res["transaction"]["amount"]) for res in body["results"]]
+    assert got == [(0, "BBB0000002", 20.0), (2, "CCC0000003", 30.0)]
+    # each row keeps its own SMS and score
+    for res in body["results"]:
+        alert = session.get(FraudAlert, res["fraud"]["alert_id"])
+        assert alert.sms_text == items[res["index"]]["text"]
@@ -0,0 +1,71 @@
+# tests/test_behavior.py
+from datetime import datetime, timedelta
+
+from sqlmodel import Session
+
+from app import crud
+from app.utils.behavior import BURST_COUNT, MIN_HISTORY, behavior_profiles
+
+
+def add_transactions(session, amounts, counterparty_phone=None):
+    user = crud.get_or_create_user(session, "0700000001")
+    txs = [crud.create_transaction(session, user_id=user.id, amount=a, counterparty_phone=counterparty_phone)
+           for a in amounts]
+    session.commit()
+    return txs
+
+
+def test_amount_far_above_the_usual(session):
+    txs = add_transactions(session, [100.0] * MIN_HISTORY + [5000.0])
+    features = behavior_profiles.features(session, txs[-1])
+    assert (features.history, features.amount_mean, features.amount_ratio) == (MIN_HISTORY, 100.0, 50.0)
+    assert behavior_profiles.score(session, txs[-1]) >= 0.4
+    assert behavior_profiles.features(session, txs[2]).history == 2
+
+
+def test_burst_of_messages(session):
+    txs = add_transactions(session, [100.0] * (BURST_COUNT + 1))
+    assert behavior_profiles.features(session, txs[-1]).recent_count == BURST_COUNT
+    assert behavior_profiles.score(session, txs[-1]) >= 0.3
+
+
+def add_with_event_times(session, event_times):
+    user = crud.get_or_create_user(session, "0700000001")
+    txs = [crud.create_transaction(session, user_id=user.id, amount=100.0, event_time=t) for t in event_times]
+    session.commit()
+    return txs
+
+
+def test_backlog_of_old_messages_is_not_a_burst(session):
+    # forwarded within a second of each other, but sent a day apart
+    start = datetime(2024, 6, 1, 9, 0)
+    txs = add_with_event_times(session, [start + timedelta(days=i) for i in range(BURST_COUNT + 2)])
+    assert behavior_profiles.features(session, txs[-1]).recent_count == 0
+    assert behavior_profiles.features(session, txs[-1], refresh=True).recent_count == 0
+
+
+def test_burst_counts_by_event_time(session):
+    start = datetime(2024, 6, 1, 9, 0)
+    # the last message was sent a minute after the others, whatever order they arrived in
+    times = [start + timedelta(seconds=10 * i) for i in range(BURST_COUNT)][::-1] + [start + timedelta(minutes=2)]
+    txs = add_with_event_times(session, times)
+    assert behavior_profiles.features(session, txs[-1]).recent_count == BURST_COUNT
+    assert behavior_profiles.features(session, txs[-1], refresh=True).recent_count == BURST_COUNT
+
+
+def test_rebuilt_profile_gives_the_same_features(session):
+    txs = add_transactions(session, [100.0, 250.0, 40.0], counterparty_phone="0711111111")
+    cached = behavior_profiles.features(session, txs[-1])
+    behavior_profiles.cache.clear()
+    assert behavior_profiles.features(session, txs[-1]) == cached
+    assert cached.new_counterparty is False
+
+
+def test_rollback_drops_the_touched_profile(engine, session):
+    (tx,) = add_transactions(session, [100.0])
+    behavior_profiles.features(session, tx)
+    with Session(engine) as other:
+        crud.create_transaction(other, user_id=tx.user_id, amount=100.0)
+        assert tx.user_id in behavior_profiles.cache
+        other.rollback()
+    assert tx.user_id not in behavior_profiles.cache
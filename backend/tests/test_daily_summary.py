@@ -0,0 +1,99 @@
+# tests/test_daily_summary.py
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from sqlmodel import select
+
+from app import crud
+from app.jobs.rebuild_daily_aggregates import rebuild
+from app.models import DailyAggregate
+from tests.helpers import sms
+
+
+def add_transactions(session, phone, amounts, tx_type="SEND"):
+    user = crud.get_or_create_user(session, phone)
+    txs = [crud.create_transaction(session, user_id=user.id, amount=a, tx_type=tx_type) for a in amounts]
+    session.commit()
+    return user, txs
+
+
+def test_aggregate_upsert_adds_to_existing_rows(session):
+    user = crud.get_or_create_user(session, "0700000001")
+    day = datetime(2024, 6, 5, 10, 0)
+    first = [SimpleNamespace(user_id=user.id, timestamp=day, tx_type="SEND", amount=100.0),
+             SimpleNamespace(user_id=user.id, timestamp=day, tx_type="SEND", amount=50.0),
+             SimpleNamespace(user_id=user.id, timestamp=day, tx_type=None, amount=1.0)]
+    crud.add_to_daily_aggregates(session, first)
+    crud.add_to_daily_aggregates(session, [SimpleNamespace(user_id=user.id, timestamp=day + timedelta(hours=5),
+                                                           tx_type="SEND", amount=25.0)])
+    session.commit()
+    rows = session.exec(select(DailyAggregate.tx_type, DailyAggregate.total_amount, DailyAggregate.tx_count)
+                        .order_by(DailyAggregate.tx_type)).all()
+    assert [tuple(r) for r in rows] == [("SEND", 175.0, 3), ("UNKNOWN", 1.0, 1)]
+
+
+def test_summary(client):
+    client.post("/api/sms/parse", json={"phone": "0700000001", "text": sms(code="AAA0000001", amount="100.00")})
+    client.post("/api/sms/parse", json={"phone": "0700000001", "text": sms(code="BBB0000002", amount="40.00")})
+    client.post("/api/sms/parse", json={"phone": "0700000001",
+                                        "text": sms(code="CCC0000003", amount="500.00", kind="received")})
+    r = client.get("/api/transactions/summary", params={"phone": "0700000001"})
+    assert r.status_code == 200
+    body = r.json()
+    assert (body["income"], body["spend"], body["net"]) == (500.0, 140.0, 360.0)
+    assert body["totals"]["SEND"] == {"amount": 140.0, "count": 2}
+    assert body["end"] == str(datetime.utcnow().date())
+
+
+def test_summary_errors(client, session):
+    assert client.get("/api/transactions/summary", params={"phone": "0799999999"}).status_code == 404
+    add_transactions(session, "0700000001", [10.0])
+    r = client.get("/api/transactions/summary",
+                   params={"phone": "0700000001", "start": "2024-06-05", "end": "2024-06-01"})
+    assert r.status_code == 400
+
+
+AGGREGATES = (select(DailyAggregate.user_id, DailyAggregate.day, DailyAggregate.tx_type,
+                     DailyAggregate.total_amount, DailyAggregate.tx_count)
+              .order_by(DailyAggregate.user_id, DailyAggregate.tx_type))
+
+
+def test_rebuild_matches_incremental_aggregates(session):
+    add_transactions(session, "0700000001", [10.0, 20.0])
+    add_transactions(session, "0700000002", [5.0], tx_type="RECEIVE")
+    add_transactions(session, "0700000003", [1.0, 2.0, 3.0])
+    incremental = session.exec(AGGREGATES).all()
+    # drifted and stale rows are replaced
+    row = session.get(DailyAggregate, incremental[0][:3])
+    row.total_amount = 0.0
+    stale = crud.get_or_create_user(session, "0700000004")
+    session.add(DailyAggregate(user_id=stale.id, day=datetime(2024, 6, 5).date(), tx_type="SEND",
+                               total_amount=9.0, tx_count=1))
+    session.commit()
+
+    assert rebuild(chunk_size=2) == 6
+    session.expire_all()
+    assert session.exec(AGGREGATES).all() == incremental
+
+
+def test_failed_rebuild_keeps_whole_ranges(session, monkeypatch):
+    add_transactions(session, "0700000001", [10.0, 20.0])
+    add_transactions(session, "0700000002", [5.0, 6.0])
+    incremental = session.exec(AGGREGATES).all()
+    calls = []
+    add = crud.add_to_daily_aggregates
+
+    def add_then_fail(s, txs):
+        calls.append(len(txs))
+        if len(calls) == 2:
+            raise RuntimeError("crash")
+        add(s, txs)
+
+    monkeypatch.setattr(crud, "add_to_daily_aggregates", add_then_fail)
+    with pytest.raises(RuntimeError):
+        rebuild(chunk_size=2)
+    # the first user was rebuilt, the second kept its totals: the summary never saw a gap
+    assert calls == [2, 2]
+    session.expire_all()
+    assert session.exec(AGGREGATES).all() == incremental
@@ -0,0 +1,82 @@
+# tests/test_idempotency.py
+from datetime import datetime, timedelta
+
+from sqlmodel import select
+
+from app.jobs.purge_ingest_keys import ensure_columns, purge
+from app.models import IngestKey, Transaction
+from app.utils.idempotency import idempotency_store
+from tests.helpers import sms
+
+
+def test_retry_gets_the_first_response(client, session):
+    first = client.post("/api/sms/parse", json={"phone": "0700000001", "text": sms()})
+    # same SMS text up to case and whitespace
+    again = client.post("/api/sms/parse", json={"phone": "0700000001", "text": "  " + sms().upper()})
+    assert again.status_code == 200
+    assert again.json() == first.json()
+    assert len(session.exec(select(Transaction)).all()) == 1
+
+
+def test_idempotency_key_replay_from_the_db(client, session):
+    headers = {"Idempotency-Key": "abc"}
+    first = client.post("/api/sms/parse", json={"phone": "0700000001", "text": sms()}, headers=headers)
+    idempotency_store.cache.clear()
+    again = client.post("/api/sms/parse", json={"phone": "0700000001", "text": sms()}, headers=headers)
+    assert again.json() == first.json()
+    assert len(session.exec(select(IngestKey)).all()) == 1
+
+
+def test_idempotency_key_reused_for_another_sms_is_422(client, session):
+    headers = {"Idempotency-Key": "abc"}
+    client.post("/api/sms/parse", json={"phone": "0700000001", "text": sms()}, headers=headers)
+    other = sms(code="ZXC1234567", amount="50.00")
+    r = client.post("/api/sms/parse", json={"phone": "0700000001", "text": other}, headers=headers)
+    assert r.status_code == 422
+    idempotency_store.cache.clear()
+    r = client.post("/api/sms/parse", json={"phone": "0700000001", "text": other}, headers=headers)
+    assert r.status_code == 422
+    assert len(session.exec(select(Transaction)).all()) == 1
+
+
+def test_batch_replay(client, session):
+    items = [{"phone": "0700000001", "text": sms(code=f"DDD000000{i}", amount=f"{i}00.00")} for i in range(1, 4)]
+    first = client.post("/api/sms/parse/batch", json={"items": items}).json()
+    again = client.post("/api/sms/parse/batch", json={"items": items}).json()
+    assert again == first
+    assert len(session.exec(select(Transaction)).all()) == 3
+
+
+def test_batch_repeats_get_the_first_result(client, session):
+    items = [{"phone": "0700000001", "text": sms(code="EEE0000001")},
+             {"phone": "0700000002", "text": sms(code="EEE0000002")},
+             {"phone": "0700000001", "text": sms(code="EEE0000001")}]
+    body = client.post("/api/sms/parse/batch", json={"items": items}).json()
+    assert body["errors"] == []
+    results = body["results"]
+    assert [res["index"] for res in results] == [0, 1, 2]
+    assert results[2]["transaction"]["id"] == results[0]["transaction"]["id"]
+    assert len(session.exec(select(Transaction)).all()) == 2
+
+
+def test_purge_ingest_keys(engine, session):
+    old = datetime.utcnow() - timedelta(days=8)
+    session.add_all([IngestKey(key=f"old{i}", created_at=old) for i in range(5)])
+    session.add(IngestKey(key="new"))
+    session.commit()
+    ensure_columns(engine)
+
+    assert purge(days=7, chunk_size=2) == 5
+    assert session.exec(select(IngestKey.key)).all() == ["new"]
+
+
+def test_batch_repeats_of_a_failed_item_get_its_error(client, session):
+    client.post("/api/sms/parse", json={"phone": "0700000001", "text": sms(code="FFF0000001", amount="10.00")})
+    duplicate = {"phone": "0700000001", "text": sms(code="FFF0000001", amount="11.00")}
+    items = [duplicate, duplicate, {"phone": "0700000001", "text": "hello"}]
+    body = client.post("/api/sms/parse/batch", json={"items": items}).json()
+    assert body["results"] == []
+    assert [(e["index"], e["detail"]) for e in body["errors"]] == [
+        (0, "Duplicate M-Pesa transaction."), (1, "Duplicate M-Pesa transaction."),
+        (2, "Could not parse amount from SMS.")]
+    assert len(session.exec(select(Transaction)).all()) == 1
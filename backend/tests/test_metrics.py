@@ -0,0 +1,32 @@
+# tests/test_metrics.py
+from sqlalchemy import create_engine, text
+
+from app.utils import metrics
+from tests.helpers import sms
+
+
+def test_metrics_endpoint(client):
+    client.post("/api/sms/parse", json={"phone": "0700000001", "text": sms()})
+    body = client.get("/metrics").text
+    assert 'http_request_duration_seconds_count{method="POST",route="/api/sms/parse",status="200"}' in body
+    assert 'stage_duration_seconds_count{stage="parse"}' in body
+    assert "db_query_duration_seconds_count" in body
+    assert 'cache_stats{cache="idempotency",stat="size"} 1' in body
+
+
+def checkout_count():
+    return sum(sum(counts) for counts, _ in metrics.POOL_CHECKOUT_SECONDS._series.values())
+
+
+def test_pool_checkout_timed_only_when_enabled(monkeypatch):
+    engine = create_engine("sqlite://", poolclass=metrics.TimedQueuePool)
+    monkeypatch.setattr(metrics, "METRICS_ENABLED", False)
+    before = checkout_count()
+    with engine.connect() as conn:
+        conn.execute(text("select 1"))
+    assert checkout_count() == before
+
+    monkeypatch.setattr(metrics, "METRICS_ENABLED", True)
+    with engine.connect() as conn:
+        conn.execute(text("select 1"))
+    assert checkout_count() == before + 1
@@ -0,0 +1,85 @@
+# tests/test_post_ingest.py
+import threading
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from sqlmodel import select
+
+from app import crud
+from app.models import PostIngestJob, Receipt
+from app.routers.sms_router import build_result
+from app.utils import post_ingest
+from tests.helpers import sms
+
+
+def make_job(session, raw_sms=None):
+    user = crud.get_or_create_user(session, "0700000001")
+    tx = crud.create_transaction(session, user_id=user.id, amount=100.0, raw_sms=raw_sms or sms())
+    job = crud.create_post_ingest_job(session, tx.id)
+    session.commit()
+    return job.id
+
+
+def test_inline_status(client):
+    body = client.post("/api/sms/parse", json={"phone": "0700000001", "text": sms()}).json()
+    assert body["status"] == "done"
+    assert "status_url" not in body
+    r = client.get(f"/api/sms/status/{body['transaction']['id']}")
+    assert r.status_code == 200
+    assert r.json()["status"] == "done"
+    assert r.json()["receipt_id"] == body["receipt_id"]
+    assert client.get("/api/sms/status/999").status_code == 404
+
+
+def test_pending_result_points_to_its_status():
+    tx = SimpleNamespace(id=7, amount=100.0, currency="KES", tx_type="SEND", source="M-PESA",
+                         timestamp=datetime(2024, 6, 5), mpesa_code=None, counterparty_name=None,
+                         counterparty_phone=None, balance=None, event_time=None)
+    assert build_result(tx, status="pending")["status_url"] == "/api/sms/status/7"
+
+
+def test_job_runs_once(session):
+    job_id = make_job(session)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(post_ingest.execute(job_id))) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(results, key=str) == [False, None, None, None]
+    assert post_ingest.execute(job_id) is None
+    assert len(session.exec(select(Receipt)).all()) == 1
+    job = session.get(PostIngestJob, job_id)
+    assert (job.status, job.attempts) == ("done", 1)
+
+
+def test_claim_jobs_skips_claimed_ones(session):
+    job_id = make_job(session)
+    assert post_ingest.claim_jobs(10) == [job_id]
+    assert post_ingest.claim_jobs(10) == []
+    assert post_ingest.execute(job_id) is None        # already claimed by claim_jobs
+    assert post_ingest.execute(job_id, claimed=True) is False
+
+
+def test_expired_lease_is_claimed_again(session):
+    job_id = make_job(session)
+    job = session.get(PostIngestJob, job_id)
+    job.status = "running"
+    job.updated_at = datetime.utcnow() - post_ingest.LEASE - timedelta(seconds=1)
+    session.commit()
+    assert post_ingest.claim_jobs(10) == [job_id]
+
+
+def test_failed_job_is_retried_then_given_up(session, monkeypatch):
+    def broken(*args, **kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(post_ingest, "run_job", broken)
+    job_id = make_job(session)
+    for _ in range(post_ingest.MAX_ATTEMPTS - 1):
+        assert post_ingest.execute(job_id) is True
+    assert post_ingest.execute(job_id) is False
+    session.expire_all()
+    job = session.get(PostIngestJob, job_id)
+    assert (job.status, job.attempts) == ("failed", post_ingest.MAX_ATTEMPTS)
+    assert "boom" in job.error
@@ -0,0 +1,71 @@
+# tests/test_receipt_export.py
+import io
+import re
+import zipfile
+from datetime import datetime
+
+from app import crud
+from tests.helpers import sms
+
+TODAY = str(datetime.utcnow().date())
+
+
+def ingest(client, phone, n):
+    items = [{"phone": phone, "text": sms(code=f"EXP{i:07d}", amount=f"{i + 1}0.00")} for i in range(n)]
+    body = client.post("/api/sms/parse/batch", json={"items": items}).json()
+    return [res["receipt_id"] for res in body["results"]]
+
+
+def test_export_zip(client):
+    # more than one pool chunk
+    receipt_ids = ingest(client, "0700000001", 30)
+    ingest(client, "0700000002", 1)
+    r = client.get("/api/sms/receipts/export", params={"phone": "0700000001", "start": TODAY, "end": TODAY})
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "application/zip"
+    assert r.headers["Content-Disposition"] == f'attachment; filename="receipts_0700000001_{TODAY}_{TODAY}.zip"'
+    with zipfile.ZipFile(io.BytesIO(r.content)) as zf:
+        assert zf.namelist() == [f"receipt_{i}.pdf" for i in receipt_ids]
+        assert all(zf.read(name).startswith(b"%PDF") for name in zf.namelist())
+
+
+def test_export_pdf(client):
+    ingest(client, "0700000001", 30)
+    r = client.get("/api/sms/receipts/export",
+                   params={"phone": "0700000001", "start": TODAY, "end": TODAY, "format": "pdf"})
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "application/pdf"
+    pdf = r.content
+    assert pdf.startswith(b"%PDF") and pdf.endswith(b"%%EOF\n")
+    assert b"/Count 30" in pdf
+    # startxref points at the cross-reference table, and each entry at its object
+    startxref = int(re.search(rb"startxref\n(\d+)", pdf).group(1))
+    assert pdf[startxref:].startswith(b"xref")
+    offsets = re.findall(rb"(\d{10}) 00000 n", pdf[startxref:])
+    assert len(offsets) > 30
+    for num, offset in enumerate(offsets, start=1):
+        assert pdf[int(offset):].startswith(b"%d 0 obj" % num)
+
+
+def test_export_filename_is_sanitized(client, session):
+    crud.get_or_create_user(session, '07"00; x')
+    session.commit()
+    r = client.get("/api/sms/receipts/export", params={"phone": '07"00; x', "start": TODAY, "end": TODAY})
+    assert r.status_code == 200
+    assert r.headers["Content-Disposition"] == f'attachment; filename="receipts_07_00__x_{TODAY}_{TODAY}.zip"'
+
+
+def test_export_date_range(client):
+    ingest(client, "0700000001", 2)
+    r = client.get("/api/sms/receipts/export",
+                   params={"phone": "0700000001", "start": "2020-01-01", "end": "2020-01-31"})
+    with zipfile.ZipFile(io.BytesIO(r.content)) as zf:
+        assert zf.namelist() == []
+
+
+def test_export_errors(client):
+    params = {"phone": "0799999999", "start": TODAY, "end": TODAY}
+    assert client.get("/api/sms/receipts/export", params=params).status_code == 404
+    ingest(client, "0700000001", 1)
+    params = {"phone": "0700000001", "start": TODAY, "end": TODAY, "format": "tar"}
+    assert client.get("/api/sms/receipts/export", params=params).status_code == 422
@@ -0,0 +1,62 @@
+# tests/test_receipts.py
+import os
+
+from app.utils.pdf_cache import ReceiptPDFCache, etag_matches, receipt_cache
+from tests.helpers import sms
+
+
+def test_receipt_etag_and_304(client):
+    receipt_id = client.post("/api/sms/parse", json={"phone": "0700000001", "text": sms()}).json()["receipt_id"]
+    r = client.get(f"/api/sms/receipt/{receipt_id}/pdf")
+    assert r.status_code == 200
+    assert r.content.startswith(b"%PDF")
+    etag = r.headers["ETag"]
+    assert "immutable" in r.headers["Cache-Control"]
+
+    r = client.get(f"/api/sms/receipt/{receipt_id}/pdf", headers={"If-None-Match": etag})
+    assert r.status_code == 304
+    assert r.content == b""
+    assert r.headers["ETag"] == etag
+
+    # rendered once, then served from the cache
+    hits = receipt_cache.memory.hits
+    again = client.get(f"/api/sms/receipt/{receipt_id}/pdf", headers={"If-None-Match": '"stale"'})
+    assert again.status_code == 200
+    assert again.content.startswith(b"%PDF")
+    assert receipt_cache.memory.hits == hits + 1
+
+
+def test_missing_receipt_is_404(client):
+    assert client.get("/api/sms/receipt/999/pdf").status_code == 404
+
+
+def test_etag_matches():
+    assert etag_matches('"a", W/"b"', '"b"')
+    assert etag_matches("*", '"a"')
+    assert not etag_matches('"a"', '"b"')
+    assert not etag_matches(None, '"a"')
+
+
+def test_disk_tier_survives_a_restart(tmp_path):
+    cache = ReceiptPDFCache(max_bytes=1024, directory=str(tmp_path))
+    cache.put("ab12", b"%PDF-1")
+    restarted = ReceiptPDFCache(max_bytes=1024, directory=str(tmp_path))
+    assert restarted.get("ab12") == b"%PDF-1"
+    assert restarted.get("cd34") is None
+
+
+def test_disk_tier_prunes_the_least_recently_used(tmp_path):
+    cache = ReceiptPDFCache(max_bytes=0, directory=str(tmp_path), max_disk_bytes=300)
+    for i, key in enumerate(["aa01", "bb02", "cc03"]):
+        cache.put(key, b"x" * 100)
+        os.utime(cache._path(key), (1000 + i, 1000 + i))
+    assert cache.disk_bytes == 300
+    # a disk hit makes aa01 the most recently used
+    assert cache.get("aa01") == b"x" * 100
+
+    cache.put("dd04", b"x" * 100)
+    assert cache.pruned == 2
+    assert cache.disk_bytes == 200
+    assert [cache.get(k) is not None for k in ("aa01", "bb02", "cc03", "dd04")] == [True, False, False, True]
+    # the usage is measured again on start
+    assert ReceiptPDFCache(max_bytes=0, directory=str(tmp_path), max_disk_bytes=300).disk_bytes == 200
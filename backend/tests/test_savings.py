@@ -0,0 +1,71 @@
+# tests/test_savings.py
+import threading
+
+from sqlmodel import Session, select
+
+from app import crud
+from app.models import SavingsContribution, SavingsGoal
+from app.utils.savings_batcher import SavingsMicroBatcher
+
+
+def make_user(session, phone="0700000001"):
+    user = crud.get_or_create_user(session, phone)
+    session.commit()
+    return user
+
+
+def test_contribute_to_the_default_goal(client, session):
+    make_user(session)
+    r = client.post("/api/savings/contribute", json={"user_phone": "0700000001", "amount": 100})
+    assert r.status_code == 200
+    r = client.post("/api/savings/contribute", json={"user_phone": "0700000001", "amount": 50})
+    assert r.json() == {"goal_id": r.json()["goal_id"], "current_amount": 150.0, "target": 5000.0}
+    assert len(session.exec(select(SavingsContribution)).all()) == 2
+
+
+def test_missing_user_or_goal_is_404(client, session):
+    r = client.post("/api/savings/contribute", json={"user_phone": "0799999999", "amount": 100})
+    assert r.status_code == 404
+    make_user(session)
+    r = client.post("/api/savings/contribute", json={"user_phone": "0700000001", "amount": 100, "goal_id": 999})
+    assert r.status_code == 404
+    assert session.exec(select(SavingsContribution)).all() == []
+
+
+def test_concurrent_contributions_are_not_lost(engine, session):
+    user = make_user(session)
+    goal_id = crud.resolve_savings_goal(session, user.id)
+    session.commit()
+
+    def contribute():
+        for _ in range(5):
+            with Session(engine) as s:
+                crud.contribute_savings(s, user.id, 10.0, goal_id)
+                s.commit()
+
+    threads = [threading.Thread(target=contribute) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert session.get(SavingsGoal, goal_id).current_amount == 400.0
+    assert len(session.exec(select(SavingsContribution)).all()) == 40
+
+
+def test_micro_batcher(session):
+    user = make_user(session)
+    goal_id = crud.resolve_savings_goal(session, user.id)
+    session.commit()
+    batcher = SavingsMicroBatcher(window=0.05)
+    results = []
+    threads = [threading.Thread(target=lambda a=a: results.append(batcher.contribute(goal_id, user.id, a)))
+               for a in (1.0, 2.0, 4.0, 8.0)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(total for _, total, _ in results)[-1] == 15.0
+    assert batcher.contributions == 4
+    assert batcher.batches < 4
+    assert session.get(SavingsGoal, goal_id).current_amount == 15.0
+    assert batcher.contribute(999, user.id, 1.0) is None
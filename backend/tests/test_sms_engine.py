@@ -0,0 +1,48 @@
+# tests/test_sms_engine.py
+import pytest
+
+from app.utils.fraud_detector import score_features, score_sms_for_fraud
+from app.utils.sms_engine import classify, classify_many
+from app.utils.sms_parser import parse_features, parse_mpesa_sms
+from benchmarks.corpus import make_corpus
+from tests.legacy_sms import old_parse, old_score
+
+# overlapping keywords, keywords/amounts inside URLs, keywords inside longer ones
+EDGE_CASES = [
+    "you paid you 100",
+    "You have sent Ksh50 and you received Ksh20",
+    "paid youloan offer click http://bit.ly/x",
+    "Ksh100 see http://mpesa-verify.co/login?kes50",
+    "tinyurl.com/verifyaccount suspended pay nowpay immediately",
+    "sentreceived",
+    "kes ksh 12",
+    "KES1,2,3.456 urgent confirm update",
+    # digits outside ASCII count towards the digit score
+    "Ksh100 code ١٢٣٤٥٦٧٨٩٠١٢٣٤٥٦٧",
+    "Ksh100 ²²²²²²²²²²²²²²²²",
+    "",
+]
+
+
+def test_classify_matches_old_implementation():
+    for text in make_corpus(300, seed=4) + EDGE_CASES:
+        features = classify(text)
+        assert parse_features(features) == old_parse(text), text
+        assert score_features(features) == old_score(text), text
+
+
+def test_overlapping_keywords():
+    # "you paid" ends inside "paid you": the receive word must still be seen
+    assert classify("you paid you 100").tx_type == "RECEIVE"
+    assert parse_mpesa_sms("you paid you Ksh100")["tx_type"] == "RECEIVE"
+
+
+def test_keywords_inside_url():
+    f = classify("Ksh100 see http://mpesa-verify.co/login")
+    assert f.has_url and f.keywords == {"verify", "login"}
+    assert score_sms_for_fraud("Ksh100 see http://mpesa-verify.co/login") == pytest.approx(0.9)
+
+
+def test_classify_many():
+    texts = make_corpus(50)
+    assert classify_many(texts) == [classify(t) for t in texts]
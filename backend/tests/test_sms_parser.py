@@ -0,0 +1,85 @@
+# tests/test_sms_parser.py
+from datetime import datetime
+
+from sqlmodel import select
+
+from app import crud
+from app.jobs.backfill_transaction_fields import backfill, ensure_columns
+from app.models import Transaction
+from app.utils.sms_parser import parse_details, parse_mpesa_sms
+from tests.helpers import sms
+
+
+def test_parse_details():
+    details = parse_details(sms(code="qwe1234567", amount="1,500.00", name="MARY WANJIKU",
+                                phone="0722000111", balance="12,345.50"))
+    assert details == {
+        "mpesa_code": "QWE1234567",
+        "counterparty_name": "MARY WANJIKU",
+        "counterparty_phone": "0722000111",
+        "balance": 12345.5,
+        "event_time": datetime(2024, 6, 5, 14, 15),
+    }
+
+
+def test_parse_received():
+    parsed = parse_mpesa_sms(sms(kind="received", amount="2,350.00", when="1/12/2024 at 9:05 AM"))
+    assert parsed["amount"] == 2350.0
+    assert parsed["tx_type"] == "RECEIVE"
+    assert parsed["event_time"] == datetime(2024, 12, 1, 9, 5)
+
+
+def test_parse_details_without_fields():
+    assert parse_details("Your verification code is 123456.") == {
+        "mpesa_code": None, "counterparty_name": None, "counterparty_phone": None,
+        "balance": None, "event_time": None,
+    }
+
+
+def test_parse_stores_details(client, session):
+    r = client.post("/api/sms/parse", json={"phone": "0700000001", "text": sms()})
+    assert r.status_code == 200
+    body = r.json()
+    assert body["transaction"]["mpesa_code"] == "QWE1234567"
+    assert body["transaction"]["event_time"] == "2024-06-05 14:15:00"
+
+    tx = session.get(Transaction, body["transaction"]["id"])
+    assert (tx.amount, tx.balance, tx.counterparty_phone) == (1000.0, 5000.0, "0712345678")
+
+
+def test_parse_rejects_sms_without_amount(client):
+    r = client.post("/api/sms/parse", json={"phone": "0700000001", "text": "hello"})
+    assert r.status_code == 400
+
+
+def test_duplicate_code_is_409_for_the_same_user(client):
+    assert client.post("/api/sms/parse", json={"phone": "0700000001", "text": sms()}).status_code == 200
+    # a different text (so not an idempotent replay) carrying the same M-Pesa code
+    r = client.post("/api/sms/parse", json={"phone": "0700000001", "text": sms(amount="999.00")})
+    assert r.status_code == 409
+
+
+def test_both_parties_can_forward_the_same_code(client, session):
+    sent = client.post("/api/sms/parse", json={"phone": "0700000001", "text": sms()})
+    received = client.post("/api/sms/parse", json={"phone": "0712345678", "text": sms(kind="received")})
+    assert sent.status_code == received.status_code == 200
+    codes = session.exec(select(Transaction.user_id, Transaction.mpesa_code)).all()
+    assert len(codes) == 2
+    assert {code for _, code in codes} == {"QWE1234567"}
+
+
+def test_backfill_parses_raw_sms(engine, session):
+    sender = crud.get_or_create_user(session, "0700000001")
+    receiver = crud.get_or_create_user(session, "0712345678")
+    # rows stored before the parsed columns existed
+    rows = [crud.create_transaction(session, user_id=sender.id, amount=1000.0, raw_sms=sms()),
+            crud.create_transaction(session, user_id=sender.id, amount=1000.0, raw_sms=sms()),
+            crud.create_transaction(session, user_id=receiver.id, amount=1000.0, raw_sms=sms(kind="received"))]
+    session.commit()
+    ensure_columns(engine)
+
+    assert backfill(chunk_size=2) == 3
+    session.expire_all()
+    got = [(tx.user_id, tx.mpesa_code, tx.balance) for tx in (session.get(Transaction, r.id) for r in rows)]
+    # the user's oldest row keeps a repeated code; the other party keeps theirs
+    assert got == [(sender.id, "QWE1234567", 5000.0), (sender.id, None, 5000.0), (receiver.id, "QWE1234567", 5000.0)]
@@ -0,0 +1,66 @@
+# tests/test_transactions.py
+from datetime import datetime, timedelta
+
+from app import crud
+from app.utils.pagination import decode_cursor, encode_cursor
+
+
+def add_transactions(session, phone, amounts, tx_type="SEND"):
+    user = crud.get_or_create_user(session, phone)
+    txs = [crud.create_transaction(session, user_id=user.id, amount=a, tx_type=tx_type) for a in amounts]
+    session.commit()
+    return user, txs
+
+
+def test_pages_cover_the_history_newest_first(client, session):
+    _, txs = add_transactions(session, "0700000001", [float(i) for i in range(1, 8)])
+    add_transactions(session, "0700000002", [99.0])
+    # two rows with an equal timestamp: the id breaks the tie
+    txs[3].timestamp = txs[4].timestamp
+    session.commit()
+    expected = [tx.id for tx in sorted(txs, key=lambda t: (t.timestamp, t.id), reverse=True)]
+
+    ids, cursor, pages = [], None, 0
+    while True:
+        params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+        r = client.get("/api/transactions/by-phone/0700000001", params=params)
+        assert r.status_code == 200
+        ids += [row["id"] for row in r.json()]
+        pages += 1
+        cursor = r.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert ids == expected
+    assert pages == 3
+    assert "raw_sms" not in r.json()[0]
+
+
+def test_filters(client, session):
+    add_transactions(session, "0700000001", [10.0, 20.0], tx_type="SEND")
+    add_transactions(session, "0700000001", [30.0], tx_type="RECEIVE")
+    r = client.get("/api/transactions/by-phone/0700000001", params={"tx_type": "RECEIVE"})
+    assert [row["amount"] for row in r.json()] == [30.0]
+    future = (datetime.utcnow() + timedelta(days=1)).isoformat()
+    assert client.get("/api/transactions/by-phone/0700000001", params={"start": future}).json() == []
+    r = client.get("/api/transactions/by-phone/0700000001", params={"end": future})
+    assert len(r.json()) == 3
+
+
+def test_bad_cursor_is_400(client, session):
+    add_transactions(session, "0700000001", [10.0])
+    r = client.get("/api/transactions/by-phone/0700000001", params={"cursor": "not-a-cursor"})
+    assert r.status_code == 400
+    # also for a phone without transactions
+    r = client.get("/api/transactions/by-phone/0799999999", params={"cursor": "not-a-cursor"})
+    assert r.status_code == 400
+
+
+def test_unknown_phone_has_no_transactions(client):
+    r = client.get("/api/transactions/by-phone/0799999999")
+    assert r.status_code == 200
+    assert r.json() == []
+
+
+def test_cursor_round_trip():
+    ts = datetime(2024, 6, 5, 14, 15, 0, 123456)
+    assert decode_cursor(encode_cursor(ts, 42)) == (ts, 42)
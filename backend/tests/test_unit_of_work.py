@@ -0,0 +1,30 @@
+# tests/test_unit_of_work.py
+import pytest
+from sqlmodel import select
+
+from app import crud
+from app.models import Transaction, User
+from tests.helpers import sms
+
+
+def test_crud_helpers_leave_the_commit_to_the_caller(session):
+    user = crud.get_or_create_user(session, "0700000001")
+    tx = crud.create_transaction(session, user_id=user.id, amount=10.0)
+    assert tx.id is not None  # flushed
+    session.rollback()
+    assert session.exec(select(User)).all() == []
+    assert session.exec(select(Transaction)).all() == []
+
+
+def test_failed_request_writes_nothing(client, session, monkeypatch):
+    create_transaction = crud.create_transaction
+
+    def create_then_fail(*args, **kwargs):
+        create_transaction(*args, **kwargs)
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(crud, "create_transaction", create_then_fail)
+    with pytest.raises(RuntimeError):
+        client.post("/api/sms/parse", json={"phone": "0700000001", "text": sms()})
+    assert session.exec(select(User)).all() == []
+    assert session.exec(select(Transaction)).all() == []
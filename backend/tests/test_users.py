@@ -0,0 +1,59 @@
+# tests/test_users.py
+from sqlmodel import Session, select
+
+from app import crud
+from app.models import User
+from app.utils.user_cache import user_cache
+
+
+def test_get_or_create_user_is_an_upsert(session):
+    user = crud.get_or_create_user(session, "0700000001", name="Amina")
+    session.commit()
+    again = crud.get_or_create_user(session, "0700000001")
+    assert again == user
+    assert again.name == "Amina"
+    assert len(session.exec(select(User)).all()) == 1
+
+
+def test_insert_loses_the_race_without_failing(engine, session):
+    # another request created the phone after this one missed the cache and the SELECT
+    with Session(engine) as other:
+        winner = User(phone="0700000001")
+        other.add(winner)
+        other.commit()
+        winner_id = winner.id
+    assert crud._insert_users(session, {"0700000001": None}) == {}
+    assert crud.get_or_create_user(session, "0700000001").id == winner_id
+
+
+def test_get_or_create_users(session):
+    existing = crud.get_or_create_user(session, "0700000001")
+    session.commit()
+    users = crud.get_or_create_users(session, ["0700000001", "0700000002", "0700000002"])
+    session.commit()
+    assert set(users) == {"0700000001", "0700000002"}
+    assert users["0700000001"].id == existing.id
+    assert len(session.exec(select(User)).all()) == 2
+
+
+def test_cache_filled_on_commit_only(session):
+    crud.get_or_create_user(session, "0700000001")
+    assert user_cache.by_phone("0700000001") is None
+    session.rollback()
+    assert user_cache.by_phone("0700000001") is None
+    assert crud.get_user_by_phone(session, "0700000001") is None
+
+    user = crud.get_or_create_user(session, "0700000001")
+    session.commit()
+    assert user_cache.by_phone("0700000001") == user
+    assert user_cache.by_id(user.id) == user
+
+
+def test_cache_invalidated_on_update(session):
+    user = crud.get_or_create_user(session, "0700000001", name="Old")
+    session.commit()
+    row = session.get(User, user.id)
+    row.name = "New"
+    session.commit()
+    assert user_cache.by_phone("0700000001") is None
+    assert crud.get_user(session, user.id).name == "New"